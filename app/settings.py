@@ -63,6 +63,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'crispy_forms',
     # Admin Interface
     #'admin_interface',
@@ -265,6 +266,15 @@ AUTH_PASSWORD_VALIDATORS = [
 
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
+# deployments set a cache shared by all processes (redis, see vars.py.tpl),
+# the generation counters of core/cache.py only invalidate cached data
+# everywhere with a shared cache
+CACHES = vars.vars.get("CACHES", {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+})
+
 CHANNEL_LAYERS = {
   'default': {
       'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -23,6 +23,13 @@ vars = {
             },
         },
     },
+    # deployments with several processes need a shared cache, e.g.
+    # "CACHES": {
+    #     'default': {
+    #         'BACKEND': 'django_redis.cache.RedisCache',
+    #         'LOCATION': 'redis://127.0.0.1:6379/1',
+    #     },
+    # },
     "LOGGING": {
         "filename": "../log/development.log",
         "level": "DEBUG",
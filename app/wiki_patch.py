@@ -26,6 +26,10 @@ def patch_wiki():
     from wiki.models.article import Article
     Article.add_revision = add_revision
 
+    # serve the stored html of the published revision to readers
+    Article.original_get_cached_content = Article.get_cached_content
+    Article.get_cached_content = get_cached_content
+
     # fix mergeview get method
     from wiki.views.article import MergeView
     MergeView.get = fixed_mergeview_get
@@ -143,9 +147,34 @@ def get_context_data(self, **kwargs):
     kwargs["article_tabs"] = registry.get_article_tabs()
     kwargs["children_slice"] = self.children_slice
     kwargs["children_slice_more"] = len(self.children_slice) > 20
+    kwargs["children_menu"] = children_menu(self.request.user, self.urlpath, self.children_slice)
     kwargs["plugins"] = registry.get_plugins()
     return kwargs
 
+def children_menu(user, urlpath, children_slice):
+    """
+    Titles, slugs and paths of the children of the urlpath for the submenu,
+    from the wiki tree snapshot for everybody but the superusers, who also
+    see the articles which are not public yet. children_slice holds the
+    children the user can read, so owners and groups see theirs too.
+    """
+    from wiki.models import URLPath
+    from core.wiki_tree import children
+
+    if urlpath is None:
+        return []
+    if not user.is_superuser:
+        readable = {child.id for child in children_slice}
+        return [child for child in children(urlpath.path) if child["other_read"] or child["urlpath"] in readable]
+    urlpaths = (URLPath.objects
+                .select_related('article__current_revision')
+                .in_bulk([child.id for child in children_slice]))
+    return [{
+        "title": child.article.current_revision.title if child.article.current_revision else "",
+        "slug": child.slug,
+        "path": urlpath.path + child.slug + "/",
+    } for child in (urlpaths[child.id] for child in children_slice if child.id in urlpaths)]
+
 def add_revision(self, new_revision, save=True):
     """
     Sets the properties of a revision and ensures its the current
@@ -184,6 +213,10 @@ def add_revision(self, new_revision, save=True):
         self.current_revision = new_revision
     if save:
         self.save()
+    # render the published revision for the readers
+    if is_superuser and save:
+        from core.wiki_render import render_article
+        render_article(self)
 
     # create submission for admins
     if not is_superuser:
@@ -197,6 +230,18 @@ def add_revision(self, new_revision, save=True):
                                   message=message,
                                   url=url)
 
+def get_cached_content(self, user=None):
+    """
+    Readers get the html stored for the current revision, only superusers
+    (who publish revisions) get the rendering of django-wiki.
+    """
+    from django.utils.safestring import mark_safe
+    from core.wiki_render import rendered_html
+
+    if user is not None and user.is_superuser:
+        return self.original_get_cached_content(user=user)
+    return mark_safe(rendered_html(self))
+
 def fixed_mergeview_get(self, request, article, revision_id, *args, **kwargs):
     from django.contrib import messages
     from django.shortcuts import get_object_or_404
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CasetrainingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'casetraining'
+
+    def ready(self):
+        from . import signals
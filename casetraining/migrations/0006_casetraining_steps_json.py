@@ -0,0 +1,51 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:00
+
+import casetraining.steps
+from django.db import migrations, models
+import json
+
+
+def parse_steps(apps, schema_editor):
+    Casetraining = apps.get_model('casetraining', 'Casetraining')
+    invalid = []
+    for case in Casetraining.objects.only('id', 'steps').iterator():
+        try:
+            steps = json.loads(case.steps or "[]")
+        except ValueError:
+            invalid.append(case.id)
+            continue
+        Casetraining.objects.filter(id=case.id).update(steps_json=steps)
+    # the text column is removed below, repair the steps instead of losing them
+    if invalid:
+        raise ValueError("steps of the casetrainings {} are not valid JSON, repair them and migrate again"
+                         .format(", ".join(map(str, invalid))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casetraining', '0005_alter_casetraining_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casetraining',
+            name='steps_json',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(parse_steps, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='casetraining',
+            name='steps',
+        ),
+        migrations.RenameField(
+            model_name='casetraining',
+            old_name='steps_json',
+            new_name='steps',
+        ),
+        migrations.AlterField(
+            model_name='casetraining',
+            name='steps',
+            field=models.JSONField(blank=True, default=list, validators=[casetraining.steps.validate_steps]),
+        ),
+    ]
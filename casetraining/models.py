@@ -12,6 +12,8 @@ from wiki.models import Article
 
 from core.models import Submission
 
+from .steps import validate_steps, clean_steps, texts
+
 class Casetraining(ClusterableModel):
 
     class Meta:
@@ -28,8 +30,8 @@ class Casetraining(ClusterableModel):
     user = models.ForeignKey(User, null=True, on_delete=models.CASCADE)
     # sachverhalt
     facts = models.TextField(default='')
-    # our json config for the steps
-    steps = models.TextField(null=True, blank=True)
+    # our json config for the steps, see casetraining/steps.py
+    steps = models.JSONField(default=list, blank=True, validators=[validate_steps])
     # slug der lösungsskizze
     solution_slug = models.TextField(null=True, blank=True)
     approved = models.BooleanField(default=False)
@@ -43,10 +45,18 @@ class Casetraining(ClusterableModel):
                                        tags=["p", "span", "li", "ol", "ul", "strong"],
                                        attributes=["style"], styles=["background-color"])
         self.difficulty = bleach.clean(self.difficulty)
-        self.steps      = bleach.clean(self.steps)
         self.name       = bleach.clean(self.name)
+        if kwargs.get('update_fields') is None or 'steps' in kwargs['update_fields']:
+            self.steps  = clean_steps(self.steps, self._stored_texts())
         super(Casetraining, self).save(*args, **kwargs)
 
+    def _stored_texts(self):
+        # texts of the stored steps are sanitized already
+        if not self.pk:
+            return frozenset()
+        stored = Casetraining.objects.filter(pk=self.pk).values_list('steps', flat=True).first()
+        return frozenset(texts(stored))
+
     def __str__(self):
         return "{}".format(self.name)
 
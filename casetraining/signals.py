@@ -0,0 +1,30 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from wiki.models import URLPath
+
+from core.cache import bump_generation
+from core.materials import invalidate_materials
+from core.models import Submission
+
+from .models import Casetraining
+
+@receiver(pre_save, sender=Casetraining)
+def remember_solution_slug(sender, instance, **kwargs):
+    # the solution may change, the old article has to be invalidated too
+    instance._previous_solution_slug = None
+    if instance.pk:
+        instance._previous_solution_slug = Casetraining.objects.filter(pk=instance.pk).values_list('solution_slug', flat=True).first()
+
+@receiver(post_save, sender=Casetraining)
+@receiver(post_delete, sender=Casetraining)
+def invalidate_solution_materials(sender, instance, **kwargs):
+    slugs = {instance.solution_slug, getattr(instance, '_previous_solution_slug', None)} - {None, ''}
+    if slugs:
+        invalidate_materials(URLPath.objects.filter(slug__in=slugs).values_list('article_id', flat=True))
+
+@receiver(post_save, sender=Casetraining)
+@receiver(post_delete, sender=Casetraining)
+@receiver(post_delete, sender=Submission)
+def bump_casetraining_generation(sender, **kwargs):
+    # the cached index listing, a deleted submission changes the listing of its case
+    bump_generation("casetraining")
@@ -0,0 +1,68 @@
+"""
+Steps of a casetraining: [{"step_type": "read", "config": ..., "intro": "..."}]
+
+The config of a step is edited by the step components of the case editor
+(frontend/src/scripts/vue/casetraining) and only checked to be JSON here.
+All texts in the steps, keys included, are sanitized one by one with
+bleach.
+"""
+import json
+
+import bleach
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+STEP_TYPES = ['read', 'mark_sections', 'penalties', 'problem_areas', 'weights', 'gap_text', 'free_text', 'solution']
+STEP_KEYS = {'step_type', 'config', 'intro'}
+
+def validate_steps(steps):
+    if not isinstance(steps, list):
+        raise ValidationError("steps must be a list")
+    for index, step in enumerate(steps, start=1):
+        if not isinstance(step, dict):
+            raise ValidationError("step %(index)s must be an object", params={'index': index})
+        if step.get('step_type') not in STEP_TYPES:
+            raise ValidationError("step %(index)s has an unknown step_type", params={'index': index})
+        if not set(step) <= STEP_KEYS:
+            raise ValidationError("step %(index)s has unknown keys", params={'index': index})
+        if not isinstance(step.get('intro') or "", str):
+            raise ValidationError("step %(index)s has an invalid intro", params={'index': index})
+
+def texts(value):
+    """
+    Yields all strings of the JSON value, keys included.
+    """
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from texts(item)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield key
+            yield from texts(item)
+
+def clean_steps(value, cleaned=frozenset()):
+    """
+    Returns the JSON value with all strings sanitized. Strings in cleaned
+    (the texts of the stored steps) were sanitized before and are kept.
+    """
+    if isinstance(value, str):
+        return value if value in cleaned else bleach.clean(value)
+    if isinstance(value, list):
+        return [clean_steps(item, cleaned) for item in value]
+    if isinstance(value, dict):
+        return {clean_steps(key, cleaned): clean_steps(item, cleaned) for key, item in value.items()}
+    return value
+
+def compiled_steps(case):
+    """
+    The steps of the case as minified JSON, safe to embed in a script tag.
+    Cached per case and revision (updated_at).
+    """
+    return cache.get_or_set("casetraining_steps_{}".format(case.id), lambda: _compile(case.steps),
+                            timeout=(60 * 60 * 24), version=int(case.updated_at.timestamp() * 1000000))
+
+def _compile(steps):
+    return (json.dumps(steps, ensure_ascii=False, separators=(',', ':'))
+            .replace('<', '\\u003C').replace('>', '\\u003E').replace('&', '\\u0026'))
@@ -1,4 +1,10 @@
+from unittest import mock
+import json
+from django.core.exceptions import ValidationError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
 from django.contrib.auth.models import User
 
@@ -6,6 +12,7 @@ from pages.models.jurcoach import JurcoachPage
 from wagtailpolls.models import Poll
 
 from .models import Casetraining
+from .steps import validate_steps
 
 class CasetrainingTestCase(TestCase):
     def setUp(self):
@@ -24,6 +31,54 @@ class CasetrainingTestCase(TestCase):
     def test_to_string(self):
         self.assertEqual(str(self.obj), "Test case 1")
 
+class StepsTestCase(TestCase):
+    def setUp(self):
+        self.case = Casetraining.objects.create(
+            name="Test case 1",
+            difficulty="advanced",
+            steps=[{"step_type": "read", "config": {"text": "<script>x</script>"}, "intro": "<b>Lesen</b>"}],
+        )
+
+    def test_texts_are_cleaned(self):
+        self.assertEqual(self.case.steps[0]["config"]["text"], "&lt;script&gt;x&lt;/script&gt;")
+        self.assertEqual(self.case.steps[0]["intro"], "<b>Lesen</b>")
+
+    def test_keys_are_cleaned(self):
+        self.case.steps[0]["config"] = {"<img src=x onerror=alert(1)>": "text"}
+        self.case.save()
+        self.assertEqual(list(self.case.steps[0]["config"]), ["&lt;img src=x onerror=alert(1)&gt;"])
+
+    def test_only_changed_texts_are_cleaned(self):
+        self.case.steps.append({"step_type": "solution", "config": None, "intro": "<i>neu</i>"})
+        with mock.patch("bleach.clean", side_effect=lambda text, **kwargs: text) as clean:
+            self.case.save()
+        cleaned = [call.args[0] for call in clean.call_args_list]
+        self.assertIn("<i>neu</i>", cleaned)
+        self.assertNotIn("<b>Lesen</b>", cleaned)
+        self.assertNotIn("read", cleaned)
+
+    def test_validate_steps(self):
+        validate_steps([{"step_type": "read", "config": None}])
+        with self.assertRaises(ValidationError):
+            validate_steps([{"step_type": "unknown"}])
+        with self.assertRaises(ValidationError):
+            validate_steps({"step_type": "read"})
+
+    def test_show_embeds_compiled_steps(self):
+        self.case.approved = True
+        self.case.save()
+        response = self.client.get("/falltraining/show/{}/".format(self.case.id))
+        self.assertContains(response, '"intro":"\\u003Cb\\u003ELesen\\u003C/b\\u003E"')
+
+    def test_api_accepts_steps_as_string(self):
+        response = self.client.put("/falltraining/api/case/{}".format(self.case.id),
+                                   json.dumps({"name": "Test case 1", "difficulty": "advanced",
+                                               "steps": json.dumps([{"step_type": "read", "config": None}])}),
+                                   content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.case.refresh_from_db()
+        self.assertEqual(self.case.steps, [{"step_type": "read", "config": None}])
+
 class ViewTestCase(TestCase):
 
     def setUp(self):
@@ -49,3 +104,37 @@ class ViewTestCase(TestCase):
     def test_deny_api_access_to_not_approved_response(self):
         response = self.client.get("/falltraining/api/case/{}.json".format(self.case_hidden.id))
         self.assertContains(response, "", status_code=404)
+
+class IndexTestCase(TestCase):
+    def setUp(self):
+        self.case = Casetraining.objects.create(name="Fall 1", difficulty="beginner", steps=[], approved=True)
+        Casetraining.objects.create(name="Entwurf", difficulty="advanced", steps=[])
+
+    def casetraining_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('casetraining:index'))
+        return response, [query for query in queries if 'casetraining_casetraining' in query['sql']]
+
+    def test_listing_is_cached(self):
+        response, queries = self.casetraining_queries()
+        self.assertContains(response, "Fall 1")
+        self.assertNotContains(response, "Entwurf")
+        self.assertEqual(len(queries), 1)
+
+        response, queries = self.casetraining_queries()
+        self.assertContains(response, "Fall 1")
+        self.assertEqual(queries, [])
+
+    def test_save_invalidates_listing(self):
+        self.casetraining_queries()
+        self.case.name = "Fall 2"
+        self.case.save()
+        response, _ = self.casetraining_queries()
+        self.assertContains(response, "Fall 2")
+
+    def test_staff_listing_is_cached_separately(self):
+        self.casetraining_queries()
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        response, _ = self.casetraining_queries()
+        self.assertContains(response, "Entwurf")
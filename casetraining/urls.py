@@ -7,11 +7,23 @@ import json
 
 from . import views
 from .models import *
+from .steps import validate_steps
 
 app_name = "casetraining"
 
+class StepsField(serializers.JSONField):
+    # older clients send the steps as JSON string
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                self.fail('invalid')
+        return super().to_internal_value(data)
+
 class AdminCasetrainingSerializer(serializers.ModelSerializer):
     user_name = serializers.SerializerMethodField(read_only=True)
+    steps = StepsField(required=False, validators=[validate_steps])
 
     def get_user_name(self, obj):
         return str(obj.user)
@@ -23,6 +35,7 @@ class AdminCasetrainingSerializer(serializers.ModelSerializer):
 class UserCasetrainingSerializer(serializers.ModelSerializer):
     user_name = serializers.SerializerMethodField(read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
+    steps = StepsField(required=False, validators=[validate_steps])
 
     def get_user_name(self, obj):
         return str(obj.user)
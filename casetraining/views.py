@@ -1,29 +1,42 @@
 from django.conf import settings
-from django.core.cache import cache
 from django.core.mail import send_mail
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.cache import cache_page
-import hashlib
 import json
 
 from wiki.models import Article, ArticleRevision, URLPath
 
+from core.cache import generation
+from core.wiki_tree import readable_articles
+
 from .models import Casetraining
+from .steps import compiled_steps
 
 def index(request):
-    casetrainings = Casetraining.objects.order_by('name')
-    if not request.user.is_staff:
-        casetrainings = casetrainings.filter(approved=True)
-
+    staff = request.user.is_staff
     return render(request, "casetraining/index.html", {
         'banner': '/media/original_images/Bogota_IMG_0242-modified.jpg',
-        "advanced":  casetrainings.filter(difficulty="advanced"),
-        "beginner":  casetrainings.filter(difficulty="beginner"),
-        "shortcase": casetrainings.filter(difficulty="shortcase"),
+        # only evaluated when the cached listing is missing
+        "cases": SimpleLazyObject(lambda: _cases_by_difficulty(staff)),
+        "staff": staff,
+        "generation": generation("casetraining"),
     })
 
+def _cases_by_difficulty(staff):
+    casetrainings = Casetraining.objects.select_related('submission').order_by('name')
+    if staff:
+        casetrainings = casetrainings.select_related('user')
+    else:
+        casetrainings = casetrainings.filter(approved=True)
+
+    cases = {difficulty: [] for difficulty, _ in Casetraining.DIFFICULTY_CHOICES}
+    for case in casetrainings:
+        cases.setdefault(case.difficulty, []).append(case)
+    return cases
+
 def new(request):
     return render(request, "casetraining/new.html", {
         'banner': '/media/original_images/Bogota_IMG_0242-modified.jpg',
@@ -38,6 +51,7 @@ def show(request, case_id):
     return render(request, "casetraining/show.html", {
         'banner': '/media/original_images/Bogota_IMG_0242-modified.jpg',
         "case": case,
+        "steps": compiled_steps(case),
     })
 
 def free_text_mail(request, id):
@@ -80,18 +94,11 @@ def free_text_mail(request, id):
     return HttpResponse(201)
 
 def wiki_categories(request):
-    modified = Article.objects.order_by('-modified').first().modified
-    hash = hashlib.md5(str(modified).encode('utf-8')).hexdigest()
-    result = cache.get_or_set("wiki_categories", _wiki_categories_list, timeout=(60 * 60), version=hash)
-    return JsonResponse(result, safe=False)
+    return JsonResponse(_wiki_categories_list(), safe=False)
 
 def _wiki_categories_list():
-    articles = filter(lambda x: x.other_read, Article.objects.all())
-    return list(map(_wiki_article, articles))
-
-def _wiki_article(article):
-    return {
-        "id": article.id,
-        "title": article.current_revision.title,
-        "url": article.get_absolute_url(),
-    }
+    return [{
+        "id": article["id"],
+        "title": article["title"],
+        "url": article["url"],
+    } for article in readable_articles()]
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ScrapeConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import signals
@@ -0,0 +1,31 @@
+"""
+Generation counters for cache invalidation.
+
+Cached data is stored with the current generation of its source as cache
+version. Signals bump the generation when the source changes, so stale
+entries are never read again and simply expire.
+
+The counters only invalidate across processes with a shared cache backend
+(redis, set by the deployment vars, see CACHES in app/settings.py), the
+per process LocMemCache used by default (development, tests) only sees
+the bumps of its own process.
+"""
+import time
+
+from django.core.cache import cache
+
+def _key(name):
+    return "generation_" + name
+
+def _initial():
+    # start at a timestamp, so a lost counter never resurrects old versions
+    return int(time.time() * 1000)
+
+def generation(name):
+    return cache.get_or_set(_key(name), _initial, timeout=None)
+
+def bump_generation(name):
+    try:
+        cache.incr(_key(name))
+    except ValueError:
+        cache.set(_key(name), _initial(), timeout=None)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from wiki.models import Article
+
+from core.wiki_render import render_article, stale_articles
+
+class Command(BaseCommand):
+    help = "Renders the current revisions of the wiki articles which have no stored html yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="render all articles again")
+
+    def handle(self, *args, **options):
+        articles = Article.objects.filter(current_revision__isnull=False) if options['all'] else stale_articles()
+        count = 0
+        for article in articles.select_related('current_revision').iterator():
+            render_article(article)
+            count += 1
+        self.stdout.write(self.style.SUCCESS("rendered {} articles".format(count)))
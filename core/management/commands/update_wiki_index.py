@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from wiki.models import Article
+
+from core.wiki_index import index_articles, index_tree
+
+class Command(BaseCommand):
+    help = "Rebuilds the search index of all wiki articles"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        ids = list(Article.objects.order_by('id').values_list('id', flat=True))
+        for start in range(0, len(ids), options['batch_size']):
+            index_articles(ids[start:start + options['batch_size']])
+        index_tree()
+        self.stdout.write(self.style.SUCCESS("indexed {} articles".format(len(ids))))
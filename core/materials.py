@@ -0,0 +1,48 @@
+"""
+Learning materials of a wiki article: approved flashcard decks, MCT
+questions and casetrainings (linked by their solution_slug).
+
+Cached per article. Decks and casetrainings bump the generation of their
+articles (flashcards/signals.py, casetraining/signals.py), questions the
+quiz generation and wiki changes the wiki generation, as slugs decide
+which casetrainings belong to an article.
+"""
+from django.core.cache import cache
+from wiki.models import URLPath
+
+from casetraining.models import Casetraining
+from flashcards.models import Deck
+from quiz.models import Question
+
+from .cache import generation, bump_generation
+
+def _generation_name(article_id):
+    return "materials_{}".format(article_id)
+
+def invalidate_materials(article_ids):
+    for article_id in {article_id for article_id in article_ids if article_id}:
+        bump_generation(_generation_name(article_id))
+
+def article_materials(article_id):
+    version = "{}-{}-{}".format(generation("wiki"), generation("quiz"), generation(_generation_name(article_id)))
+    return cache.get_or_set("materials_{}".format(article_id), lambda: _article_materials(article_id),
+                            timeout=(60 * 60 * 24), version=version)
+
+def _article_materials(article_id):
+    decks = list(Deck.objects
+                 .filter(wiki_category_id=article_id, approved=True)
+                 .order_by('id')
+                 .values_list('id', flat=True))
+    questions = list(Question.objects
+                     .filter(category_id=article_id, approved=True, current__isnull=False)
+                     .order_by('id')
+                     .values_list('id', flat=True))
+    casetrainings = list(Casetraining.objects
+                         .filter(approved=True, solution_slug__in=URLPath.objects.filter(article_id=article_id).values('slug'))
+                         .order_by('id')
+                         .values_list('id', flat=True))
+    return {
+        "decks": {"count": len(decks), "ids": decks},
+        "questions": {"count": len(questions), "ids": questions},
+        "casetrainings": {"count": len(casetrainings), "ids": casetrainings},
+    }
@@ -0,0 +1,39 @@
+# Generated by Django 3.2.5 on 2026-10-18 16:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0003_mptt_upgrade'),
+        ('core', '0011_submission_url'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.CreateModel(
+            name='ArticleIndex',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='wiki.article')),
+                ('title', models.CharField(default='', max_length=512)),
+                ('content', models.TextField(default='')),
+                ('url', models.TextField(default='')),
+                ('readable', models.BooleanField(default=False)),
+                ('leaf', models.BooleanField(default=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='articleindex',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_article_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='articleindex',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['title'], name='core_article_title_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_articleindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='articleindex',
+            name='breadcrumb',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.5 on 2026-10-18 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0003_mptt_upgrade'),
+        ('core', '0013_articleindex_breadcrumb'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderedArticle',
+            fields=[
+                ('article', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='wiki.article')),
+                ('config_hash', models.CharField(max_length=32)),
+                ('html', models.TextField()),
+                ('rendered', models.DateTimeField(auto_now=True)),
+                ('revision', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='wiki.articlerevision')),
+            ],
+        ),
+    ]
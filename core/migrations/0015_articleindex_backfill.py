@@ -0,0 +1,59 @@
+# Generated by Django 3.2.5 on 2026-10-19 10:00
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.urls import reverse
+
+
+def build_index(apps, schema_editor):
+    # like core.wiki_index.index_articles and index_tree, on the historical models
+    Article = apps.get_model('wiki', 'Article')
+    URLPath = apps.get_model('wiki', 'URLPath')
+    ArticleIndex = apps.get_model('core', 'ArticleIndex')
+
+    entries = {}
+    for id, title, content, other_read, deleted in (Article.objects
+                                                    .filter(current_revision__isnull=False)
+                                                    .values_list('id', 'current_revision__title',
+                                                                 'current_revision__content', 'other_read',
+                                                                 'current_revision__deleted')):
+        entries[id] = ArticleIndex(article_id=id, title=title, content=content,
+                                   readable=bool(other_read and not deleted))
+
+    urlpaths = list(URLPath.objects.order_by('tree_id', 'lft').values_list('id', 'parent_id', 'slug', 'article_id'))
+    parents = {id: parent_id for id, parent_id, _, _ in urlpaths}
+    slugs = {id: slug or "" for id, _, slug, _ in urlpaths}
+    articles = {id: article_id for id, _, _, article_id in urlpaths}
+    has_children = set(parents.values())
+    seen = set()
+    for id, _, _, article_id in urlpaths:
+        if article_id in seen or article_id not in entries:
+            continue
+        seen.add(article_id)
+        nodes = []
+        node = id
+        while parents[node] is not None:
+            nodes.append(node)
+            node = parents[node]
+        nodes.reverse()
+        entry = entries[article_id]
+        entry.url = reverse("wiki:get", kwargs={"path": "".join(slugs[node] + "/" for node in nodes)})
+        entry.breadcrumb = [entries[articles[node]].title if articles[node] in entries else "" for node in nodes[:-1]]
+        entry.leaf = id not in has_children
+
+    ArticleIndex.objects.all().delete()
+    ArticleIndex.objects.bulk_create(entries.values(), batch_size=200)
+    ArticleIndex.objects.update(search_vector=(SearchVector('title', weight='A', config='german') +
+                                               SearchVector('content', weight='B', config='german')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0003_mptt_upgrade'),
+        ('core', '0014_renderedarticle'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
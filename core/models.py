@@ -2,6 +2,8 @@ from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.mail import send_mail
 from django.db import models
 from wiki.models import ArticleRevision
@@ -64,3 +66,41 @@ class Submission(models.Model):
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     rewards = models.IntegerField(default=0, null=False)
+
+class ArticleIndex(models.Model):
+    """
+    Denormalized data of a wiki article for search and listings, maintained
+    by core.wiki_index (see core/signals.py).
+    """
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='core_article_search_idx'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='core_article_title_idx'),
+        ]
+
+    article = models.OneToOneField('wiki.Article', primary_key=True, on_delete=models.CASCADE, related_name='+')
+    title = models.CharField(max_length=512, default='')
+    content = models.TextField(default='')
+    url = models.TextField(default='')
+    # titles of the ancestors below the root
+    breadcrumb = models.JSONField(default=list)
+    # article.other_read
+    readable = models.BooleanField(default=False)
+    # the urlpath of the article has no children
+    leaf = models.BooleanField(default=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    def __str__(self):
+        return self.title
+
+class RenderedArticle(models.Model):
+    """
+    Html of the current revision of a wiki article, see core.wiki_render.
+    """
+    article = models.OneToOneField('wiki.Article', primary_key=True, on_delete=models.CASCADE, related_name='+')
+    revision = models.ForeignKey('wiki.ArticleRevision', on_delete=models.CASCADE, related_name='+')
+    # core.wiki_render.config_hash() at rendering
+    config_hash = models.CharField(max_length=32)
+    html = models.TextField()
+    rendered = models.DateTimeField(auto_now=True)
@@ -1253,12 +1253,9 @@ def create_question_version(question_data):
         description=question_data['description'],
     )
 
-    # save answers
-    for answer in answers:
-        #question_version.answerversion_set.create(text=answer['text'], correct=answer['correct'])
-        question_version.answers.create(text=answer['text'], correct=answer['correct'])
-
     question_version.save()
+    # save answers
+    question_version.set_answers(answers)
     question_version.approve()
 
 def get_type(soup):
@@ -0,0 +1,53 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from mptt.signals import node_moved
+from wiki.models import Article, ArticleRevision, URLPath
+
+from .cache import bump_generation
+from .wiki_index import index_articles, index_tree
+from .wiki_render import invalidate_rendered
+
+@receiver(post_save, sender=Article)
+@receiver(post_delete, sender=Article)
+@receiver(post_save, sender=ArticleRevision)
+@receiver(post_delete, sender=ArticleRevision)
+@receiver(post_save, sender=URLPath)
+@receiver(post_delete, sender=URLPath)
+@receiver(node_moved, sender=URLPath)
+def bump_wiki_generation(sender, **kwargs):
+    bump_generation("wiki")
+
+@receiver(post_save, sender=Article)
+def index_article(sender, instance, **kwargs):
+    # add_revision and approving a revision save the article
+    index_articles([instance.id])
+
+@receiver(post_save, sender=URLPath)
+@receiver(post_delete, sender=URLPath)
+@receiver(node_moved, sender=URLPath)
+def index_wiki_tree(sender, **kwargs):
+    index_tree()
+
+@receiver(pre_save, sender=URLPath)
+@receiver(pre_delete, sender=URLPath)
+def remember_url(sender, instance, **kwargs):
+    # the url before a move or deletion, the ancestors still exist
+    instance._previous_url = _url(instance.pk) if instance.pk else None
+
+@receiver(post_save, sender=URLPath)
+@receiver(post_delete, sender=URLPath)
+@receiver(node_moved, sender=URLPath)
+def invalidate_rendered_articles(sender, instance, signal, **kwargs):
+    # links to added, deleted or moved articles (and their descendants) change their marks
+    urls = {getattr(instance, '_previous_url', None)}
+    if signal is not post_delete:
+        urls.add(_url(instance.pk))
+    urls.discard(None)
+    if signal is post_save and not kwargs.get('created') and len(urls) == 1:
+        return
+    invalidate_rendered(urls)
+
+def _url(urlpath_id):
+    # from the database, the ancestors cached by the instance may be outdated
+    urlpath = URLPath.objects.filter(pk=urlpath_id).first()
+    return urlpath.get_absolute_url() if urlpath else None
@@ -17,4 +17,4 @@ def sorted_wiki(children, urlpath):
     if not ordered:
         return children
 
-    return sorted(children, key=lambda child: ordered.index(child.slug) if child.slug in ordered else 999, reverse=False)
+    return sorted(children, key=lambda child: ordered.index(child["slug"]) if child["slug"] in ordered else 999, reverse=False)
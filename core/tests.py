@@ -1,11 +1,26 @@
+from unittest import mock
+
 from django.core import mail
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.crypto import salted_hmac
 from django.contrib.messages import get_messages
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
 from birdsong.models import Contact
+from wiki.models import Article, ArticleRevision, URLPath
+
+from casetraining.models import Casetraining
+from flashcards.models import Deck
+from quiz.models import Question, QuestionVersion
 
+from app.wiki_patch import children_menu
+from core.models import ArticleIndex, RenderedArticle
+from core.wiki_index import _autocomplete, article_paths
+from core.wiki_render import stale_articles
+from core.wiki_tree import children, nodes, readable_articles, snapshot
 from core.views import newsletter_confirm, newsletter_subscribe
 
 class SubscriptionTest(TestCase):
@@ -50,3 +65,232 @@ class ConfirmationTest(TestCase):
                              fetch_redirect_response=False)
         messages = list(get_messages(response.wsgi_request))
         self.assertEqual(str(messages[0]), 'Der Bestätigungslink ist nicht korrekt.')
+
+class LearningMaterialsTest(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        url = URLPath.create_urlpath(URLPath.root(), "slug",
+                                     title="Wiki-Title",
+                                     content="Content")
+        self.article = url.article
+        self.article.other_read = True
+        self.article.save()
+        self.user = User.objects.create(username='testuser')
+        self.deck = Deck.objects.create(name="Deck", user=self.user, wiki_category=self.article, approved=True)
+        Deck.objects.create(name="Private Deck", user=self.user, wiki_category=self.article)
+        self.case = Casetraining.objects.create(name="Case", difficulty="beginner", steps="", solution_slug="slug", approved=True)
+
+    def test_learning_materials(self):
+        self.user.bookmarks.create(content_object=self.article)
+        self.client.force_login(self.user)
+        response = self.client.get("/run/api/materials/{}".format(self.article.id))
+        self.assertEqual(response.json(), {
+            "article": self.article.id,
+            "decks": {"count": 1, "ids": [self.deck.id]},
+            "questions": {"count": 0, "ids": []},
+            "casetrainings": {"count": 1, "ids": [self.case.id]},
+            "bookmarked": True,
+        })
+
+    def test_invalidated_by_signals(self):
+        url = "/run/api/materials/{}".format(self.article.id)
+        self.client.get(url)
+        self.deck.approved = False
+        self.deck.save()
+        self.case.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.json()["decks"]["count"], 0)
+        self.assertEqual(response.json()["casetrainings"]["count"], 0)
+        self.assertFalse(response.json()["bookmarked"])
+
+    def test_unreadable_article(self):
+        self.article.other_read = False
+        self.article.save()
+        response = self.client.get("/run/api/materials/{}".format(self.article.id))
+        self.assertEqual(response.status_code, 404)
+
+class WikiSearchTest(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        self.parent = URLPath.create_urlpath(URLPath.root(), "at",
+                                             title="Strafrecht AT",
+                                             content="Notwehr und Rücktritt")
+        self.urlpath = URLPath.create_urlpath(self.parent, "notwehr",
+                                              title="Notwehr",
+                                              content="Die Notwehr setzt eine Notwehrlage voraus. <script>x</script>")
+        for urlpath in [self.parent, self.urlpath]:
+            urlpath.article.other_read = True
+            urlpath.article.save()
+
+    def test_index_follows_revisions_and_tree(self):
+        entry = ArticleIndex.objects.get(article=self.urlpath.article)
+        self.assertEqual(entry.title, "Notwehr")
+        self.assertEqual(entry.url, "/problemfelder/at/notwehr/")
+        self.assertEqual(entry.breadcrumb, ["Strafrecht AT"])
+        self.assertTrue(entry.leaf)
+        self.assertFalse(ArticleIndex.objects.get(article=self.parent.article).leaf)
+
+    def test_search(self):
+        response = self.client.get(reverse('search_wiki'), {'q': "Notwehrlage"})
+        data = response.json()["data"]
+        # the parent mentions Notwehr too, but has children
+        self.assertEqual([result["url"] for result in data], ["/problemfelder/at/notwehr/"])
+        self.assertIn("<mark>", data[0]["snippet"])
+        self.assertNotIn("<script>", data[0]["snippet"])
+        self.assertNotIn("content", data[0])
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('search_wiki'))
+        self.assertEqual(response.json()["data"], [])
+
+    def test_unreadable_articles_are_not_found(self):
+        self.urlpath.article.other_read = False
+        self.urlpath.article.save()
+        response = self.client.get(reverse('search_wiki'), {'q': "Notwehrlage"})
+        self.assertEqual(response.json()["data"], [])
+
+    def test_deleted_articles_are_not_found(self):
+        revision = ArticleRevision()
+        revision.inherit_predecessor(self.urlpath.article)
+        revision.deleted = True
+        self.urlpath.article.add_revision(revision)
+        response = self.client.get(reverse('search_wiki'), {'q': "Notwehrlage"})
+        self.assertEqual(response.json()["data"], [])
+        response = self.client.get(reverse('wiki_autocomplete'), {'q': "Notwehr"})
+        self.assertEqual(response.json()["data"], [])
+
+    def test_autocomplete(self):
+        response = self.client.get(reverse('wiki_autocomplete'), {'q': " notwer "})
+        self.assertEqual(response.json()["data"], [{
+            "id": self.urlpath.article.id,
+            "title": "Notwehr",
+            "url": "/problemfelder/at/notwehr/",
+            "breadcrumb": "Strafrecht AT",
+        }])
+
+    def test_autocomplete_filters_with_index_operators(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = _autocomplete("wehr")
+        self.assertEqual([result["title"] for result in results], ["Notwehr"])
+        where = queries[0]['sql'].split(" WHERE ")[1].split(" ORDER BY ")[0]
+        self.assertIn("ILIKE", where)
+        self.assertNotIn("UPPER(", where)
+
+    def test_autocomplete_is_cached_per_prefix(self):
+        self.client.get(reverse('wiki_autocomplete'), {'q': "Notwehr"})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('wiki_autocomplete'), {'q': "notwehr"})
+        self.assertEqual(len(response.json()["data"]), 1)
+        self.assertEqual(self.client.get(reverse('wiki_autocomplete'), {'q': "n"}).json()["data"], [])
+
+    def test_breadcrumbs_follow_titles_and_moves(self):
+        revision = ArticleRevision(title="Allgemeiner Teil", content="Notwehr")
+        self.parent.article.add_revision(revision)
+        self.parent.article.current_revision = revision
+        self.parent.article.save()
+        self.assertEqual(article_paths([self.urlpath.article.id]), {self.urlpath.article.id: {
+            "title": "Notwehr",
+            "url": "/problemfelder/at/notwehr/",
+            "breadcrumb": ["Allgemeiner Teil"],
+        }})
+
+        self.urlpath.move_to(URLPath.root())
+        self.assertEqual(article_paths([self.urlpath.article.id])[self.urlpath.article.id]["breadcrumb"], [])
+        self.assertTrue(ArticleIndex.objects.get(article=self.parent.article).leaf)
+
+    def test_articles_missing_in_the_index(self):
+        ArticleIndex.objects.filter(article=self.urlpath.article).delete()
+        self.assertEqual(article_paths([self.urlpath.article.id]), {self.urlpath.article.id: {
+            "title": "Notwehr",
+            "url": "/problemfelder/at/notwehr/",
+            "breadcrumb": ["Strafrecht AT"],
+        }})
+
+class RenderedArticleTest(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        self.article = URLPath.create_urlpath(URLPath.root(), "slug", title="Wiki-Title", content="Content").article
+        self.superuser = User.objects.create(username='admin', is_superuser=True)
+
+    def test_published_revision_is_rendered(self):
+        self.article.add_revision(ArticleRevision(title="Wiki-Title", content="**fett**", user=self.superuser))
+        rendered = RenderedArticle.objects.get(article=self.article)
+        self.assertEqual(rendered.revision, self.article.current_revision)
+        self.assertIn("<strong>fett</strong>", rendered.html)
+
+        with mock.patch.object(Article, 'render') as render:
+            self.assertIn("<strong>fett</strong>", self.article.get_cached_content())
+        render.assert_not_called()
+
+    def test_stale_articles_are_rendered_once(self):
+        self.assertIn(self.article, stale_articles())
+        self.assertIn("Content", self.article.get_cached_content())
+        self.assertNotIn(self.article, stale_articles())
+
+    def test_new_articles_invalidate_the_stored_html_linking_them(self):
+        linking = URLPath.create_urlpath(URLPath.root(), "linking", title="Linking",
+                                         content="[Neu](/problemfelder/new/)").article
+        for article in [self.article, linking]:
+            article.get_cached_content()
+        URLPath.create_urlpath(URLPath.root(), "new", title="New", content="")
+        self.assertNotIn(self.article, stale_articles())
+        self.assertIn(linking, stale_articles())
+
+class WikiTreeTest(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        self.at = URLPath.create_urlpath(URLPath.root(), "at", title="Allgemeiner Teil", content="")
+        self.tb = URLPath.create_urlpath(self.at, "tb", title="Tatbestand", content="")
+        self.tb.article.other_read = True
+        self.tb.article.save()
+
+    def test_children(self):
+        self.assertEqual(children("at/"), [{
+            "urlpath": self.tb.id,
+            "parent": self.at.id,
+            "id": self.tb.article.id,
+            "title": "Tatbestand",
+            "slug": "tb",
+            "path": "at/tb/",
+            "url": "/problemfelder/at/tb/",
+            "depth": 2,
+            "other_read": True,
+            "question_count": 0,
+            "first_question_id": None,
+        }])
+
+    def test_children_menu(self):
+        owner = User.objects.create(username='owner')
+        bt = URLPath.create_urlpath(self.at, "bt", title="Besonderer Teil", content="")
+        bt.article.owner = owner
+        bt.article.save()
+        self.assertEqual([child["title"] for child in children_menu(AnonymousUser(), self.at, [self.tb])],
+                         ["Tatbestand"])
+        self.assertEqual([child["title"] for child in children_menu(owner, self.at, [self.tb, bt])],
+                         ["Tatbestand", "Besonderer Teil"])
+
+        superuser = User.objects.create(username='admin', is_superuser=True)
+        self.assertEqual(self.at.path, "at/")
+        with self.assertNumQueries(1):
+            self.assertEqual(children_menu(superuser, self.at, [self.tb, bt]), [
+                {"title": "Tatbestand", "slug": "tb", "path": "at/tb/"},
+                {"title": "Besonderer Teil", "slug": "bt", "path": "at/bt/"},
+            ])
+
+    def test_question_counts_in_two_queries(self):
+        question = Question.objects.create(category=self.tb.article)
+        QuestionVersion.objects.create(question=question, title="Question").approve()
+        URLPath.create_urlpath(self.at, "rw", title="Rechtswidrigkeit", content="")
+        with self.assertNumQueries(2):
+            tree = {node["slug"]: node for node in nodes()}
+        self.assertEqual((tree["at"]["question_count"], tree["at"]["first_question_id"]), (1, question.id))
+        self.assertEqual((tree["tb"]["question_count"], tree["tb"]["first_question_id"]), (1, question.id))
+        self.assertEqual((tree["rw"]["question_count"], tree["rw"]["first_question_id"]), (0, None))
+
+    def test_snapshot_is_cached(self):
+        snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual([article["title"] for article in readable_articles()], ["Tatbestand"])
+
+        response = self.client.get(reverse('casetraining:wiki_categories'))
+        self.assertEqual(response.json(), [{"id": self.tb.article.id, "title": "Tatbestand", "url": "/problemfelder/at/tb/"}])
@@ -7,6 +7,8 @@ urlpatterns = [
     path('search/wiki/', views.search_wiki, name='search_wiki'),
     path('search/wiki/<str:query>', views.search_wiki, name='search_wiki'),
 
+    path('api/wiki/autocomplete', views.wiki_autocomplete, name='wiki_autocomplete'),
+    path('api/materials/<int:article_id>', views.learning_materials, name='learning_materials'),
     path('api/auth/', include('rest_framework.urls', namespace='rest_framework')),
 
     path('<str:semester>/<str:slug>/<str:filename>', views.pdf, name='pdf'),
@@ -5,15 +5,22 @@ import os
 import urllib.parse
 
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.contrib import messages
 from django.core import serializers
+from django.core.paginator import Paginator
+from django.utils.html import escape
 from wagtail.documents.models import Document
 from wiki.models import Article
 
 from pages.models.exams import Exams
 from core.seed import start
+from core.materials import article_materials
+from core.wiki_index import search, snippet_html, autocomplete
+
+SEARCH_PAGE_SIZE = 20
 
 logger = logging.getLogger('django')
 
@@ -55,34 +62,32 @@ def exams(request):
         'banner': '/media/original_images/ohnediefrau.png',
     })
 
-def search_wiki(request, query = False):
-    from django.contrib.postgres.search import SearchVector, TrigramSimilarity, TrigramDistance
-    #articles = Article.objects.annotate(
-    #    #similarity=TrigramSimilarity('current_revision__title', query),
-    #    distance=TrigramDistance('current_revision__content', query),
-    #).filter(distance__gt=0.7).order_by('distance')
-
-    if query:
-        results = Article.objects.annotate(
-            search=SearchVector(
-            #'current_revision__title',
-            'current_revision__content',
-            ),
-        ).filter(search__icontains=query)
-    else:
-        results = Article.objects.all()
-
-    articles = [{
-        'title': article.current_revision.title,
-        'url': article.get_absolute_url(),
-        'content': article.current_revision.content,
-        #'breadcrumb': " / ".join([ancestor.article.current_revision.title for ancestor in article.ancestor_objects()])
-    } for article in results if sum(1 for x in article.get_children()) == 0 and article.id != 1]
-
-    # get breadcrumb
-    # filter by content
+def search_wiki(request, query=""):
+    """
+    Ranked search over the wiki index, 20 results per ?page= with a snippet
+    of the matching content.
+    """
+    query = (query or request.GET.get('q', '')).strip()
+    if not query:
+        return JsonResponse({'data': [], 'page': 1, 'pages': 0})
+
+    page = Paginator(search(query), SEARCH_PAGE_SIZE).get_page(request.GET.get('page'))
+    return JsonResponse({
+        'data': [{
+            'title': escape(entry.title),
+            'url': entry.url,
+            'breadcrumb': escape(" / ".join(entry.breadcrumb)),
+            'snippet': snippet_html(entry.snippet),
+        } for entry in page],
+        'page': page.number,
+        'pages': page.paginator.num_pages,
+    })
 
-    return JsonResponse({'data': articles})
+def wiki_autocomplete(request):
+    """
+    Titles for the wiki search box, fired on every keystroke.
+    """
+    return JsonResponse({'data': autocomplete(request.GET.get('q', ''))})
 
 def api_exams(request):
     exams = Exams.objects.all()
@@ -148,3 +153,18 @@ def newsletter_confirm(request, hashed_email, email):
         messages.error(request, f"Der Bestätigungslink ist nicht korrekt.")
 
     return redirect("/archiv/lsh-newsletter/")
+
+def learning_materials(request, article_id):
+    """
+    Decks, MCT questions and casetrainings of a wiki article and whether the
+    visitor bookmarked it, for the wiki page in one request.
+    """
+    article = get_object_or_404(Article, id=article_id)
+    if not article.can_read(request.user):
+        raise Http404("Article not found")
+    bookmarked = False
+    if request.user.is_authenticated:
+        bookmarked = request.user.bookmarks.filter(content_type=ContentType.objects.get_for_model(Article),
+                                                   content_id=article.id).exists()
+
+    return JsonResponse(dict(article_materials(article.id), article=article.id, bookmarked=bookmarked))
@@ -0,0 +1,198 @@
+"""
+Search index of the wiki (core.models.ArticleIndex).
+
+Titles, contents and search vectors follow the current revisions of the
+articles (index_articles, on every save of an article, so on add_revision
+and when a revision is approved), urls, breadcrumbs and leaf flags follow
+the URLPath tree (index_tree, also on moves). See core/signals.py, the
+index is built initially by migration 0015 and can be rebuilt by the
+update_wiki_index management command.
+
+search serves the ranked full text search, autocomplete the search box and
+article_paths titles, urls and breadcrumbs for any listing of articles.
+"""
+import hashlib
+
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.core.cache import cache
+from django.db.models import Case, CharField, F, FloatField, Func, IntegerField, Q, Value, When
+from django.urls import reverse
+from django.utils.html import escape
+from wiki.models import Article, URLPath
+
+from .cache import generation
+from .models import ArticleIndex
+
+SEARCH_CONFIG = 'german'
+SEARCH_VECTOR = (SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+                 SearchVector('content', weight='B', config=SEARCH_CONFIG))
+MARK = ('<mark>', '</mark>')
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MIN_LENGTH = 2
+AUTOCOMPLETE_MAX_LENGTH = 50
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    # title__trigram_word_similar=query: the query is similar to a part of
+    # the title, uses the trigram index (Django 4.0 ships this lookup)
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
+
+@CharField.register_lookup
+class TrigramContains(PostgresOperatorLookup):
+    # title__trigram_contains=query: ILIKE '%query%', uses the trigram index
+    # unlike icontains, which Django compiles to UPPER(title) LIKE
+    lookup_name = 'trigram_contains'
+    postgres_operator = 'ILIKE'
+
+    def process_rhs(self, qn, connection):
+        rhs, params = super().process_rhs(qn, connection)
+        return rhs, ['%{}%'.format(connection.ops.prep_for_like_query(param)) for param in params]
+
+class WordSimilarity(Func):
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+def index_articles(article_ids):
+    """
+    Updates the entries of the articles from their current revisions.
+    """
+    articles = list(Article.objects
+                    .filter(id__in=article_ids, current_revision__isnull=False)
+                    .values_list('id', 'current_revision__title', 'current_revision__content', 'other_read',
+                                 'current_revision__deleted'))
+    entries = ArticleIndex.objects.in_bulk([id for id, _, _, _, _ in articles])
+    created = []
+    # the breadcrumbs of the children contain the title
+    retitled = False
+    for id, title, content, other_read, deleted in articles:
+        entry = entries.get(id)
+        if entry is None:
+            entry = ArticleIndex(article_id=id)
+            created.append(entry)
+        elif entry.title != title and not entry.leaf:
+            retitled = True
+        # readable like other_read of core.wiki_tree
+        entry.title, entry.content, entry.readable = title, content, bool(other_read and not deleted)
+
+    ArticleIndex.objects.bulk_create(created)
+    ArticleIndex.objects.bulk_update(entries.values(), ['title', 'content', 'readable'])
+    ArticleIndex.objects.filter(article_id__in=[id for id, _, _, _, _ in articles]).update(search_vector=SEARCH_VECTOR)
+    if retitled:
+        index_tree()
+
+def index_tree():
+    """
+    Updates urls, breadcrumbs and leaf flags of all entries from one query
+    over the URLPath tree and the indexed titles.
+    """
+    urlpaths = list(URLPath.objects.order_by('tree_id', 'lft').values_list('id', 'parent_id', 'slug', 'article_id'))
+    parents = {id: parent_id for id, parent_id, _, _ in urlpaths}
+    slugs = {id: slug or "" for id, _, slug, _ in urlpaths}
+    articles = {id: article_id for id, _, _, article_id in urlpaths}
+    has_children = set(parents.values())
+    entries = list(ArticleIndex.objects.only('article', 'title', 'url', 'breadcrumb', 'leaf'))
+    titles = {entry.article_id: entry.title for entry in entries}
+
+    tree = {}
+    for id, _, _, article_id in urlpaths:
+        # the first urlpath of an article is its url, like Article.get_absolute_url
+        if article_id not in tree:
+            nodes = _below_root(id, parents)
+            tree[article_id] = (reverse("wiki:get", kwargs={"path": "".join(slugs[node] + "/" for node in nodes)}),
+                                [titles.get(articles[node], "") for node in nodes[:-1]],
+                                id not in has_children)
+
+    changed = []
+    for entry in entries:
+        url, breadcrumb, leaf = tree.get(entry.article_id, ("", [], True))
+        if (entry.url, entry.breadcrumb, entry.leaf) != (url, breadcrumb, leaf):
+            entry.url, entry.breadcrumb, entry.leaf = url, breadcrumb, leaf
+            changed.append(entry)
+    ArticleIndex.objects.bulk_update(changed, ['url', 'breadcrumb', 'leaf'])
+
+def _below_root(id, parents):
+    # the urlpath and its ancestors below the root, top down like URLPath.path
+    nodes = []
+    while parents[id] is not None:
+        nodes.append(id)
+        id = parents[id]
+    return nodes[::-1]
+
+def article_paths(article_ids):
+    """
+    {article id: {'title', 'url', 'breadcrumb'}} of the articles, one query
+    for any number of indexed articles. Articles missing in the index (not
+    indexed yet) are looked up at their first urlpath.
+    """
+    paths = {
+        article_id: {'title': title, 'url': url, 'breadcrumb': breadcrumb}
+        for article_id, title, url, breadcrumb in (ArticleIndex.objects
+                                                   .filter(article_id__in=article_ids)
+                                                   .values_list('article_id', 'title', 'url', 'breadcrumb'))
+    }
+    missing = set(article_ids) - set(paths)
+    if missing:
+        for urlpath in (URLPath.objects
+                        .filter(article_id__in=missing, article__current_revision__isnull=False)
+                        .select_related('article__current_revision')
+                        .order_by('tree_id', 'lft')):
+            if urlpath.article_id not in paths:
+                ancestors = (urlpath.get_ancestors()
+                             .filter(parent__isnull=False)
+                             .values_list('article__current_revision__title', flat=True))
+                paths[urlpath.article_id] = {'title': urlpath.article.current_revision.title,
+                                             'url': reverse("wiki:get", kwargs={"path": urlpath.path}),
+                                             'breadcrumb': [title or "" for title in ancestors]}
+    return paths
+
+def search(query):
+    """
+    Readable leaf articles matching the query (full text or similar title),
+    best first, with a snippet of the matching content.
+    """
+    search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+    return (ArticleIndex.objects
+            .filter(readable=True, leaf=True)
+            .filter(Q(search_vector=search_query) | Q(title__trigram_similar=query))
+            .annotate(rank=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('title', query),
+                      snippet=SearchHeadline('content', search_query, config=SEARCH_CONFIG,
+                                             start_sel=MARK[0], stop_sel=MARK[1], max_words=30, min_words=15))
+            .order_by('-rank', 'title'))
+
+def snippet_html(snippet):
+    # the content is markdown written by users, only the marks are html
+    html = escape(snippet or "")
+    for mark in MARK:
+        html = html.replace(escape(mark), mark)
+    return html
+
+def autocomplete(prefix):
+    """
+    Up to 10 readable articles whose title starts with or resembles the
+    prefix (typos, inflections), with breadcrumbs. Cached per normalized
+    prefix and wiki generation.
+    """
+    prefix = " ".join(prefix.lower().split())[:AUTOCOMPLETE_MAX_LENGTH]
+    if len(prefix) < AUTOCOMPLETE_MIN_LENGTH:
+        return []
+    key = "wiki_autocomplete_" + hashlib.md5(prefix.encode('utf-8')).hexdigest()
+    return cache.get_or_set(key, lambda: _autocomplete(prefix), timeout=(60 * 60), version=generation("wiki"))
+
+def _autocomplete(prefix):
+    # only operators of the trigram index filter, prefix matches are ranked first
+    entries = list(ArticleIndex.objects
+                   .filter(readable=True)
+                   .filter(Q(title__trigram_contains=prefix) | Q(title__trigram_word_similar=prefix))
+                   .annotate(starts_with=Case(When(title__istartswith=prefix, then=Value(1)),
+                                              default=Value(0), output_field=IntegerField()),
+                             similarity=WordSimilarity(Value(prefix), 'title'))
+                   .order_by('-starts_with', '-similarity', 'title')
+                   .only('article', 'title', 'url', 'breadcrumb')[:AUTOCOMPLETE_LIMIT])
+    return [{
+        'id': entry.article_id,
+        'title': escape(entry.title),
+        'url': entry.url,
+        'breadcrumb': escape(" / ".join(entry.breadcrumb)),
+    } for entry in entries]
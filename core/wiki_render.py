@@ -0,0 +1,83 @@
+"""
+Rendered html of wiki articles (core.models.RenderedArticle).
+
+Everybody but the superusers reads the published revision with the same
+html, so it is rendered once per revision and markdown configuration:
+when a superuser publishes it (add_revision, see app/wiki_patch.py), by
+the render_wiki management command or by the first reader, instead of on
+every page view.
+
+The links plugin marks links to missing articles, so the stored html
+linking to urlpaths which are added, deleted or moved is dropped
+(core/signals.py).
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+import wiki
+from django.db.models import Exists, OuterRef, Q
+from wiki.conf import settings as wiki_settings
+from wiki.core.plugins import registry
+from wiki.models import Article
+
+from .models import RenderedArticle
+
+@lru_cache(maxsize=None)
+def config_hash():
+    """
+    Hash of everything besides the revision which changes the html.
+    """
+    config = {
+        'version': wiki.__version__,
+        'plugins': sorted(_name(plugin) for plugin in registry.get_plugins().values()),
+        'extensions': sorted(_name(extension) for extension in registry.get_markdown_extensions()),
+    }
+    for name in ['MARKDOWN_KWARGS', 'MARKDOWN_HTML_WHITELIST', 'MARKDOWN_HTML_ATTRIBUTES', 'MARKDOWN_HTML_STYLES']:
+        config[name] = getattr(wiki_settings, name, None)
+    return hashlib.md5(json.dumps(config, sort_keys=True, default=_name).encode('utf-8')).hexdigest()
+
+def _name(obj):
+    # stable across processes, unlike the repr of instances
+    cls = obj if isinstance(obj, type) else type(obj)
+    return "{}.{}".format(cls.__module__, cls.__qualname__)
+
+def rendered_html(article):
+    """
+    The html of the current revision, rendered if it is not stored yet.
+    """
+    if article.current_revision_id is None:
+        return ""
+    html = (RenderedArticle.objects
+            .filter(article=article, revision_id=article.current_revision_id, config_hash=config_hash())
+            .values_list('html', flat=True)
+            .first())
+    if html is None:
+        html = render_article(article)
+    return html
+
+def render_article(article):
+    html = article.render()
+    RenderedArticle.objects.update_or_create(article=article, defaults={
+        'revision_id': article.current_revision_id,
+        'config_hash': config_hash(),
+        'html': html,
+    })
+    return html
+
+def invalidate_rendered(urls):
+    """
+    Drops the stored html linking to the urls or below them.
+    """
+    links = Q()
+    for url in urls:
+        links |= Q(html__contains='href="{}'.format(url))
+    if links:
+        RenderedArticle.objects.filter(links).delete()
+
+def stale_articles():
+    """
+    Articles without stored html for their current revision.
+    """
+    current = RenderedArticle.objects.filter(revision=OuterRef('current_revision'), config_hash=config_hash())
+    return Article.objects.filter(current_revision__isnull=False).filter(~Exists(current))
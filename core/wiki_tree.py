@@ -0,0 +1,87 @@
+"""
+Snapshot of the wiki tree for the quiz menus and category tree, the
+casetraining category list and the wiki sidebar.
+
+One query over the URLPath tree (ordered by tree_id and lft, so parents
+come before their children) plus one over the approved questions, summed
+up the tree like quiz.models.CategoryQuestions, stored compactly as rows
+and cached under the wiki and quiz generations (core/signals.py,
+quiz/signals.py).
+"""
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.urls import reverse
+from wiki.models import URLPath
+
+from quiz.models import Question
+
+from .cache import generation
+
+# other_read: everybody can read the article and it is not deleted
+FIELDS = ('urlpath', 'parent', 'id', 'title', 'slug', 'path', 'url', 'depth', 'other_read',
+          'question_count', 'first_question_id')
+
+def snapshot():
+    """
+    Rows of FIELDS for all urlpaths in tree order, id is the article id.
+    """
+    version = "{}-{}".format(generation("wiki"), generation("quiz"))
+    return cache.get_or_set("wiki_tree", _snapshot, timeout=(60 * 60), version=version)
+
+def _snapshot():
+    urlpaths = list(URLPath.objects
+                    .order_by('tree_id', 'lft')
+                    .values_list('id', 'parent_id', 'article_id', 'article__current_revision__title',
+                                 'slug', 'level', 'article__other_read', 'article__current_revision__deleted'))
+    questions = _tree_questions(urlpaths)
+    paths = {}
+    rows = []
+    for id, parent_id, article_id, title, slug, level, other_read, deleted in urlpaths:
+        # URLPath.path, the root has the empty path
+        paths[id] = "" if parent_id is None else paths[parent_id] + (slug or "") + "/"
+        question_ids = questions.get(article_id, [])
+        rows.append((id, parent_id, article_id, title or "", slug, paths[id],
+                     reverse("wiki:get", kwargs={"path": paths[id]}), level, bool(other_read and not deleted),
+                     len(question_ids), question_ids[0] if question_ids else None))
+    return rows
+
+def _tree_questions(urlpaths):
+    # {article id: question ids of the article and its descendants}, the
+    # descendants of an article at several urlpaths are those of the first
+    own = defaultdict(list)
+    for category_id, question_id in (Question.objects
+                                     .filter(approved=True, current__isnull=False, category__isnull=False)
+                                     .values_list('category_id', 'id')):
+        own[category_id].append(question_id)
+    below = {id: set(own.get(article_id, [])) for id, _, article_id, *_ in urlpaths}
+    for id, parent_id, *_ in reversed(urlpaths):
+        if parent_id is not None:
+            below[parent_id] |= below[id]
+    questions = {}
+    for id, _, article_id, *_ in urlpaths:
+        questions.setdefault(article_id, sorted(below[id]))
+    return questions
+
+def nodes():
+    return [dict(zip(FIELDS, row)) for row in snapshot()]
+
+def children(path):
+    """
+    The children of the urlpath at path ("at/"), in tree order.
+    """
+    tree = nodes()
+    parents = {node['urlpath'] for node in tree if node['path'] == path}
+    return [node for node in tree if node['parent'] in parents]
+
+def readable_articles():
+    """
+    The articles everybody can read, each once (at its first urlpath).
+    """
+    seen = set()
+    articles = []
+    for node in nodes():
+        if node['other_read'] and node['id'] not in seen:
+            seen.add(node['id'])
+            articles.append(node)
+    return articles
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.5 on 2026-10-18 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_review_states(apps, schema_editor):
+    # existing cards are due immediately, like new ones
+    Flashcard = apps.get_model('flashcards', 'Flashcard')
+    ReviewState = apps.get_model('flashcards', 'ReviewState')
+    ReviewState.objects.bulk_create(
+        (ReviewState(user_id=user_id, flashcard_id=flashcard_id, due=created)
+         for flashcard_id, user_id, created in Flashcard.objects.values_list('id', 'user_id', 'created').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flashcards', '0006_auto_20230202_2006'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease', models.FloatField(default=2.5)),
+                ('interval', models.PositiveIntegerField(default=0)),
+                ('repetitions', models.PositiveIntegerField(default=0)),
+                ('lapses', models.PositiveIntegerField(default=0)),
+                ('due', models.DateTimeField()),
+                ('reviewed', models.DateTimeField(blank=True, null=True)),
+                ('flashcard', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_states', to='flashcards.flashcard')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flashcard_reviews', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'flashcard')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reviewstate',
+            index=models.Index(fields=['user', 'due'], name='flashcards_review_due_idx'),
+        ),
+        migrations.RunPython(create_review_states, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.5 on 2026-10-18 15:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def update_search_vectors(apps, schema_editor):
+    Flashcard = apps.get_model('flashcards', 'Flashcard')
+    Flashcard.objects.update(search_vector=(SearchVector('front_side', weight='A', config='german') +
+                                            SearchVector('back_side', weight='B', config='german')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flashcards', '0007_reviewstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashcard',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='flashcard',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='flashcards_search_idx'),
+        ),
+        migrations.RunPython(update_search_vectors, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from modelcluster.fields import ParentalKey
 from modelcluster.models import ClusterableModel
@@ -6,6 +9,8 @@ from wagtail.admin.edit_handlers import FieldPanel, InlinePanel
 
 from core.models import Submission
 from core.edit_handlers import ReadOnlyPanel
+
+from .scheduler import MASTERED_INTERVAL
 """
 Each category has several decks and each deck has a number of flashcards (flipcards).
 
@@ -25,6 +30,11 @@ from the wiki.Article model
 """
 
 
+SEARCH_CONFIG = 'german'
+SEARCH_VECTOR = (SearchVector('front_side', weight='A', config=SEARCH_CONFIG) +
+                 SearchVector('back_side', weight='B', config=SEARCH_CONFIG))
+
+
 class Category(models.Model):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(User, null=False, on_delete=models.CASCADE)
@@ -33,6 +43,21 @@ class Category(models.Model):
         return "{}".format(self.name)
 
 
+class DeckQuerySet(models.QuerySet):
+    def with_progress(self, user):
+        """
+        Annotates card_count and the due_count and mastered_count of the
+        user's review states in the same query.
+        """
+        reviews = models.Q(flashcards__review_states__user=user)
+        return self.annotate(
+            card_count=models.Count('flashcards', distinct=True),
+            due_count=models.Count('flashcards__review_states',
+                                   filter=reviews & models.Q(flashcards__review_states__due__lte=timezone.now())),
+            mastered_count=models.Count('flashcards__review_states',
+                                        filter=reviews & models.Q(flashcards__review_states__interval__gte=MASTERED_INTERVAL)),
+        )
+
 class Deck(ClusterableModel):
 
     class Meta:
@@ -47,6 +72,8 @@ class Deck(ClusterableModel):
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = DeckQuerySet.as_manager()
+
     panels = [
         FieldPanel('name'),
         ReadOnlyPanel('user', heading="Current question version"),
@@ -61,14 +88,37 @@ class Deck(ClusterableModel):
     def title(self):
         return self.__str__()
 
+    def edit_error(self, user):
+        """
+        Why the user may not change the deck or its cards, None if allowed.
+        """
+        if self.user_id != user.id:
+            return "not allowed (not users deck)"
+
+        if not user.is_staff:
+            # users can't update approved decks
+            if self.approved:
+                return "not allowed (deck is approved)"
+
+            # users can't update submitted decks
+            if self.submission_id:
+                return "not allowed (deck is submitted)"
+        return None
+
 
 class Flashcard(ClusterableModel):
+
+    class Meta:
+        indexes = [GinIndex(fields=['search_vector'], name='flashcards_search_idx')]
+
     deck = ParentalKey(Deck, on_delete=models.CASCADE, related_name='flashcards')
     user = models.ForeignKey(User, null=False, on_delete=models.CASCADE)
     front_side = models.CharField(max_length=500)
     back_side = models.CharField(max_length=500)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # maintained by update_search_vectors (see flashcards/signals.py)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     panels = [
         FieldPanel('user'),
@@ -78,3 +128,29 @@ class Flashcard(ClusterableModel):
 
     def __str__(self):
         return "{} - {} - {}".format(self.front_side, self.back_side, self.deck.name)
+
+    @classmethod
+    def update_search_vectors(cls, ids):
+        cls.objects.filter(id__in=ids).update(search_vector=SEARCH_VECTOR)
+
+
+class ReviewState(models.Model):
+    """
+    Learning progress of a user for a flashcard, scheduled by
+    flashcards.scheduler (SM-2). Cards of a user get a state when they are
+    created (see flashcards/signals.py), so due cards are found with a range
+    query on the (user, due) index.
+    """
+
+    class Meta:
+        unique_together = [('user', 'flashcard')]
+        indexes = [models.Index(fields=['user', 'due'], name='flashcards_review_due_idx')]
+
+    user = models.ForeignKey(User, null=False, on_delete=models.CASCADE, related_name='flashcard_reviews')
+    flashcard = models.ForeignKey(Flashcard, null=False, on_delete=models.CASCADE, related_name='review_states')
+    ease = models.FloatField(default=2.5)
+    interval = models.PositiveIntegerField(default=0) # days
+    repetitions = models.PositiveIntegerField(default=0)
+    lapses = models.PositiveIntegerField(default=0)
+    due = models.DateTimeField()
+    reviewed = models.DateTimeField(null=True, blank=True)
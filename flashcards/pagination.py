@@ -0,0 +1,18 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+class IdCursorPagination(CursorPagination):
+    """
+    Cursor pagination in creation (id) order: ?cursor=...&page_size=100
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+class SearchPagination(PageNumberPagination):
+    """
+    Search results are ordered by rank, which a cursor can't follow: ?page=2
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
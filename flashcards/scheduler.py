@@ -0,0 +1,38 @@
+"""
+SM-2 spaced repetition (https://super-memory.com/english/ol/sm2.htm).
+
+Grades go from 0 (complete blackout) to 5 (perfect response), a grade
+below 3 means the card was forgotten and is learned again from the start.
+"""
+from datetime import timedelta
+
+MIN_EASE = 1.3
+MIN_GRADE = 0
+MAX_GRADE = 5
+PASSING_GRADE = 3
+# cards with an interval of three weeks count as mastered (Anki's "mature")
+MASTERED_INTERVAL = 21
+
+def schedule(state, grade, reviewed):
+    """
+    Updates the ReviewState for a review with the given grade at the given
+    time (not saved).
+    """
+    if grade >= PASSING_GRADE:
+        if state.repetitions == 0:
+            state.interval = 1
+        elif state.repetitions == 1:
+            state.interval = 6
+        else:
+            state.interval = round(state.interval * state.ease)
+        state.repetitions += 1
+    else:
+        if state.repetitions > 0:
+            state.lapses += 1
+        state.repetitions = 0
+        state.interval = 1
+
+    state.ease = max(MIN_EASE, state.ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    state.due = reviewed + timedelta(days=state.interval)
+    state.reviewed = reviewed
+    return state
@@ -1,8 +1,22 @@
 from rest_framework import serializers
-from .models import Category, Flashcard, Deck
+from .models import Category, Flashcard, Deck, ReviewState
+from .scheduler import MIN_GRADE, MAX_GRADE
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """
+    Only the fields listed in ?fields=id,front_side are serialized (GET only).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        fields = request and request.method == 'GET' and request.query_params.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields.split(',')):
+                self.fields.pop(name)
+
+
+class CategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -13,8 +27,12 @@ class CategorySerializer(serializers.ModelSerializer):
         kwargs["user"] = self.fields["user"].get_default()
         return super().save(**kwargs)
 
-class DeckSerializer(serializers.ModelSerializer):
+class DeckSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user_name = serializers.SerializerMethodField(read_only=True)
+    # annotated by DeckQuerySet.with_progress, skipped if missing
+    card_count = serializers.IntegerField(read_only=True)
+    due_count = serializers.IntegerField(read_only=True)
+    mastered_count = serializers.IntegerField(read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
 
     def get_user_name(self, obj):
@@ -34,38 +52,26 @@ class DeckSerializer(serializers.ModelSerializer):
         return self.fields["user"].get_default()
 
     def save(self, **kwargs):
-        if not self.get_user().is_staff:
-            # users can't update approved decks
-            if self.instance and self.instance.approved:
-                raise Exception("not allowed (deck is approved)")
-
-            # users can't update submitted decks
-            if self.instance and self.instance.submission:
-                raise Exception("not allowed (deck is submitted)")
+        # users can't update approved or submitted decks
+        error = self.instance and self.instance.edit_error(self.get_user())
+        if error:
+            raise Exception(error)
 
         kwargs["user"] = self.get_user()
         return super().save(**kwargs)
 
-class FlashcardSerializer(serializers.ModelSerializer):
+class FlashcardSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = serializers.PrimaryKeyRelatedField(read_only=True, default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Flashcard
-        fields = "__all__"
+        exclude = ['search_vector']
 
     def validate(self, attrs):
-        deck = attrs["deck"]
-        if deck.user != self.get_user():
-            raise Exception("not allowed (not users deck)")
-
-        if not self.get_user().is_staff:
-            # users can't update approved decks
-            if deck.approved:
-                raise Exception("not allowed (deck is approved)")
-
-            # users can't update submitted decks
-            if deck.submission:
-                raise Exception("not allowed (deck is submitted)")
+        # users can't update approved or submitted decks
+        error = attrs["deck"].edit_error(self.get_user())
+        if error:
+            raise Exception(error)
         return attrs
 
     def get_user(self):
@@ -74,3 +80,24 @@ class FlashcardSerializer(serializers.ModelSerializer):
     def save(self, **kwargs):
         kwargs["user"] = self.get_user()
         return super().save(**kwargs)
+
+class ReviewStateSerializer(serializers.ModelSerializer):
+    flashcard = FlashcardSerializer(read_only=True)
+
+    class Meta:
+        model = ReviewState
+        fields = ['flashcard', 'ease', 'interval', 'repetitions', 'lapses', 'due', 'reviewed']
+
+class ReviewSerializer(serializers.Serializer):
+    grade = serializers.IntegerField(min_value=MIN_GRADE, max_value=MAX_GRADE)
+    reviewed = serializers.DateTimeField(required=False)
+
+class BatchReviewSerializer(ReviewSerializer):
+    card = serializers.IntegerField()
+    reviewed = serializers.DateTimeField()
+
+    def to_internal_value(self, data):
+        # compact form used by the offline queue: [card, grade, reviewed]
+        if isinstance(data, (list, tuple)) and len(data) == 3:
+            data = dict(zip(['card', 'grade', 'reviewed'], data))
+        return super().to_internal_value(data)
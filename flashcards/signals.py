@@ -0,0 +1,31 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from core.materials import invalidate_materials
+
+from .models import Deck, Flashcard, ReviewState
+
+@receiver(post_save, sender=Flashcard)
+def create_review_state(sender, instance, created, **kwargs):
+    # new cards are due immediately
+    if created:
+        ReviewState.objects.get_or_create(user_id=instance.user_id, flashcard=instance,
+                                          defaults={'due': instance.created})
+
+@receiver(post_save, sender=Flashcard)
+def update_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not {'front_side', 'back_side'} & set(update_fields):
+        return
+    Flashcard.update_search_vectors([instance.id])
+
+@receiver(pre_save, sender=Deck)
+def remember_deck_article(sender, instance, **kwargs):
+    # the wiki article may change, the old one has to be invalidated too
+    instance._previous_wiki_category_id = None
+    if instance.pk:
+        instance._previous_wiki_category_id = Deck.objects.filter(pk=instance.pk).values_list('wiki_category_id', flat=True).first()
+
+@receiver(post_save, sender=Deck)
+@receiver(post_delete, sender=Deck)
+def invalidate_deck_materials(sender, instance, **kwargs):
+    invalidate_materials([instance.wiki_category_id, getattr(instance, '_previous_wiki_category_id', None)])
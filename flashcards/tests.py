@@ -1,8 +1,15 @@
+from datetime import timedelta
+import json
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from django.contrib.auth.models import AnonymousUser, User
 
-from .models import Category, Deck, Flashcard
+from .models import Category, Deck, Flashcard, ReviewState
+from .scheduler import schedule
 
 class CategoryTestCase(TestCase):
     def setUp(self):
@@ -31,3 +38,194 @@ class FlashcardTestCase(TestCase):
     def test_flashcard_to_string(self):
         flashcard = Flashcard.objects.get(deck=self.deck)
         self.assertEqual(str(flashcard), "Front - Back - Test Deck 1")
+
+class SchedulerTestCase(TestCase):
+    def test_schedule(self):
+        now = timezone.now()
+        state = ReviewState(due=now)
+        self.assertEqual(schedule(state, 5, now).interval, 1)
+        self.assertEqual(schedule(state, 4, now).interval, 6)
+        self.assertEqual(schedule(state, 4, now).interval, round(6 * state.ease))
+        self.assertEqual(state.due, now + timedelta(days=state.interval))
+
+    def test_schedule_lapse(self):
+        now = timezone.now()
+        state = ReviewState(due=now, repetitions=3, interval=20)
+        schedule(state, 1, now)
+        self.assertEqual((state.repetitions, state.interval, state.lapses), (0, 1, 1))
+        self.assertLess(state.ease, 2.5)
+
+class ReviewTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', password='12345')
+        deck = Deck.objects.create(name="Test Deck 1", user=self.user)
+        self.flashcard = Flashcard.objects.create(deck=deck, front_side="Front", back_side="Back", user=self.user)
+        self.other = Flashcard.objects.create(deck=deck, front_side="Other", back_side="Back", user=self.user)
+
+    def test_new_cards_are_due(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/flashcards/api/cards/due")
+        self.assertEqual([state["flashcard"]["id"] for state in response.json()],
+                         [self.flashcard.id, self.other.id])
+
+    def test_review(self):
+        self.client.force_login(self.user)
+        response = self.client.post("/flashcards/api/cards/{}/review".format(self.flashcard.id), {"grade": 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["interval"], 1)
+        response = self.client.get("/flashcards/api/cards/due")
+        self.assertEqual([state["flashcard"]["id"] for state in response.json()], [self.other.id])
+
+    def test_review_invalid_grade(self):
+        self.client.force_login(self.user)
+        response = self.client.post("/flashcards/api/cards/{}/review".format(self.flashcard.id), {"grade": 6})
+        self.assertEqual(response.status_code, 400)
+
+    def test_review_of_other_users_card(self):
+        self.client.force_login(User.objects.create(username='other'))
+        response = self.client.post("/flashcards/api/cards/{}/review".format(self.flashcard.id), {"grade": 5})
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_review(self):
+        self.client.force_login(self.user)
+        now = timezone.now()
+        reviews = [
+            [self.flashcard.id, 5, (now - timedelta(minutes=2)).isoformat()],
+            {"card": self.flashcard.id, "grade": 4, "reviewed": (now - timedelta(minutes=1)).isoformat()},
+            [self.other.id, 1, now.isoformat()],
+        ]
+        response = self.client.post("/flashcards/api/reviews/batch", json.dumps(reviews), content_type="application/json")
+        self.assertEqual(response.json(), {"applied": 3, "skipped": 0})
+        state = ReviewState.objects.get(flashcard=self.flashcard)
+        self.assertEqual((state.repetitions, state.interval), (2, 6))
+
+        # sending the same batch again changes nothing
+        response = self.client.post("/flashcards/api/reviews/batch", json.dumps(reviews), content_type="application/json")
+        self.assertEqual(response.json(), {"applied": 0, "skipped": 3})
+        state.refresh_from_db()
+        self.assertEqual((state.repetitions, state.interval), (2, 6))
+
+    def test_batch_review_of_other_users_card(self):
+        self.client.force_login(User.objects.create(username='other'))
+        reviews = [[self.flashcard.id, 5, timezone.now().isoformat()]]
+        response = self.client.post("/flashcards/api/reviews/batch", json.dumps(reviews), content_type="application/json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_review_limit(self):
+        self.client.force_login(self.user)
+        reviews = [[self.flashcard.id, 5, timezone.now().isoformat()]] * 501
+        response = self.client.post("/flashcards/api/reviews/batch", json.dumps(reviews), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIsNone(ReviewState.objects.get(flashcard=self.flashcard).reviewed)
+
+class TransferTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.deck = Deck.objects.create(name="Test Deck 1", user=self.user)
+
+    def upload(self, name, content):
+        return self.client.post("/flashcards/api/decks/{}/import".format(self.deck.id),
+                                {"file": SimpleUploadedFile(name, content.encode())})
+
+    def test_import_tsv(self):
+        self.client.force_login(self.user)
+        response = self.upload("deck.txt", "#separator:tab\nFront 1\tBack 1\nFront 2\tBack 2\textra\n")
+        self.assertEqual(response.json(), {"imported": 2})
+        self.assertEqual(list(self.deck.flashcards.order_by('id').values_list('front_side', 'back_side')),
+                         [("Front 1", "Back 1"), ("Front 2", "Back 2")])
+        self.assertEqual(ReviewState.objects.filter(user=self.user).count(), 2)
+
+    def test_import_is_all_or_nothing(self):
+        self.client.force_login(self.user)
+        response = self.upload("deck.csv", "Front 1,Back 1\nFront 2\n")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["errors"][0]["line"], 2)
+        self.assertEqual(self.deck.flashcards.count(), 0)
+
+    def test_import_into_approved_deck(self):
+        self.client.force_login(self.user)
+        self.deck.approved = True
+        self.deck.save()
+        response = self.upload("deck.csv", "Front 1,Back 1\n")
+        self.assertEqual(response.status_code, 403)
+
+    def test_export(self):
+        self.client.force_login(self.user)
+        Flashcard.objects.create(deck=self.deck, front_side="Front, 1", back_side="Back", user=self.user)
+        response = self.client.get("/flashcards/api/decks/{}/export".format(self.deck.id))
+        self.assertEqual(b"".join(response.streaming_content).decode(), '"Front, 1",Back\r\n')
+
+    def test_export_and_import_cards_starting_with_hash(self):
+        self.client.force_login(self.user)
+        Flashcard.objects.create(deck=self.deck, front_side="#tags: Notstand", back_side="Back", user=self.user)
+        Flashcard.objects.create(deck=self.deck, front_side="#1 Notwehr", back_side="Back", user=self.user)
+        fronts = ["#tags: Notstand", "#1 Notwehr"]
+        for separator, name in [("tab", "deck.txt"), ("comma", "deck.csv")]:
+            response = self.client.get("/flashcards/api/decks/{}/export?separator={}".format(self.deck.id, separator))
+            response = self.upload(name, b"".join(response.streaming_content).decode())
+            self.assertEqual(response.json(), {"imported": 2})
+        self.assertEqual(list(self.deck.flashcards.order_by('id').values_list('front_side', flat=True)), fronts * 3)
+
+    def test_import_skips_anki_headers(self):
+        self.client.force_login(self.user)
+        response = self.upload("deck.txt", "#separator:tab\n#html:false\n#1 Notwehr\tBack\n")
+        self.assertEqual(response.json(), {"imported": 1})
+        self.assertEqual(self.deck.flashcards.get().front_side, "#1 Notwehr")
+        self.assertEqual(self.upload("deck.csv", "#1 Notwehr,Back\n").json(), {"imported": 1})
+
+class ListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', password='12345')
+        self.deck = Deck.objects.create(name="Test Deck 1", user=self.user)
+        for i in range(3):
+            Flashcard.objects.create(deck=self.deck, front_side="Front {}".format(i), back_side="Back", user=self.user)
+
+    def test_cursor_pagination(self):
+        response = self.client.get("/flashcards/api/cards", {"deck_id": self.deck.id, "page_size": 2})
+        self.assertEqual([card["front_side"] for card in response.json()["results"]], ["Front 0", "Front 1"])
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([card["front_side"] for card in response.json()["results"]], ["Front 2"])
+        self.assertIsNone(response.json()["next"])
+
+    def test_sparse_fields(self):
+        response = self.client.get("/flashcards/api/cards", {"deck_id": self.deck.id, "fields": "id,front_side"})
+        self.assertEqual(set(response.json()["results"][0]), {"id", "front_side"})
+
+    def test_deck_progress(self):
+        ReviewState.objects.filter(flashcard__front_side="Front 0").update(interval=30, due=timezone.now() + timedelta(days=30))
+        other = User.objects.create(username='other')
+        ReviewState.objects.create(user=other, flashcard=Flashcard.objects.get(front_side="Front 1"), due=timezone.now())
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3): # session, user, decks
+            response = self.client.get("/flashcards/api/decks")
+        deck = response.json()["results"][0]
+        self.assertEqual((deck["card_count"], deck["due_count"], deck["mastered_count"]), (3, 2, 1))
+
+    def test_deck_list_queries(self):
+        Deck.objects.create(name="Test Deck 2", user=self.user)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/flashcards/api/decks")
+        self.assertEqual([deck["user_name"] for deck in response.json()["results"]], ["testuser", "testuser"])
+        self.assertEqual(len([query for query in queries if 'auth_user' in query['sql']]), 2) # session user + deck list
+
+class SearchTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='testuser', password='12345')
+        other = User.objects.create(username='other')
+        deck = Deck.objects.create(name="Test Deck 1", user=self.user)
+        self.own = Flashcard.objects.create(deck=deck, front_side="Betrug", back_side="§ 263 StGB", user=self.user)
+        Flashcard.objects.create(deck=deck, front_side="Diebstahl", back_side="§ 242 StGB, kein Betrug", user=self.user)
+        private = Deck.objects.create(name="Private", user=other)
+        Flashcard.objects.create(deck=private, front_side="Betrug", back_side="privat", user=other)
+        approved = Deck.objects.create(name="Approved", user=other, approved=True)
+        self.approved = Flashcard.objects.create(deck=approved, front_side="Computerbetrug", back_side="Betrugs § 263a", user=other)
+
+    def test_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/flashcards/api/cards/search", {"q": "Betrug"})
+        results = response.json()["results"]
+        self.assertEqual(response.json()["count"], 3)
+        # matches on the front side rank first
+        self.assertEqual(results[0]["id"], self.own.id)
+        self.assertNotIn("search_vector", results[0])
@@ -0,0 +1,127 @@
+"""
+Import and export of decks as CSV or as tab separated text like Anki's
+"Notes in Plain Text" export: one card per line, front side and back side
+in the first two columns. Anki's header lines (#key:value) are skipped in
+files starting with #separator:, fields starting with # are quoted on
+export, so cards may start with # too.
+
+Both directions stream, neither the upload nor the deck are held in memory.
+"""
+import codecs
+import csv
+import itertools
+import re
+
+from django.db import transaction
+
+from .models import Flashcard, ReviewState
+
+SEPARATORS = {'comma': ',', 'tab': '\t'}
+BATCH_SIZE = 500
+MAX_CARDS = 5000
+MAX_ERRORS = 20
+MAX_LENGTH = Flashcard._meta.get_field('front_side').max_length
+ANKI_HEADER = re.compile(r'#(separator|html|tags|columns|notetype|deck|notetype column|deck column|'
+                         r'tags column|guid column):')
+
+class InvalidCards(Exception):
+    def __init__(self, errors):
+        super().__init__("invalid cards")
+        self.errors = errors
+
+def separator_for(name, filename=""):
+    """
+    The separator for ?separator=comma|tab, by default tab for .tsv and .txt files.
+    """
+    if name in SEPARATORS:
+        return SEPARATORS[name]
+    return '\t' if filename.lower().endswith(('.tsv', '.txt')) else ','
+
+def read_cards(lines, separator):
+    """
+    Yields (line number, front side, back side) of the decoded lines, raises
+    InvalidCards with the collected errors after the last line.
+    """
+    errors = []
+    lines, skipped = _skip_headers(lines)
+    reader = csv.reader(lines, delimiter=separator)
+    for row in reader:
+        line = skipped + reader.line_num
+        if not any(row):
+            continue
+        front_side, back_side = (row + ['', ''])[:2]
+        front_side, back_side = front_side.strip(), back_side.strip()
+        if not front_side or not back_side:
+            error = "front side and back side required"
+        elif len(front_side) > MAX_LENGTH or len(back_side) > MAX_LENGTH:
+            error = "longer than {} characters".format(MAX_LENGTH)
+        else:
+            yield line, front_side, back_side
+            continue
+
+        if len(errors) < MAX_ERRORS:
+            errors.append({'line': line, 'error': error})
+        else:
+            break
+
+    if errors:
+        raise InvalidCards(errors)
+
+def _skip_headers(lines):
+    # Anki's header lines, only files starting with #separator: have them,
+    # checked before parsing as quoted fields starting with # are cards
+    lines = iter(lines)
+    skipped = 0
+    for line in lines:
+        if not (line.startswith('#separator:') if skipped == 0 else ANKI_HEADER.match(line)):
+            return itertools.chain([line], lines), skipped
+        skipped += 1
+    return lines, skipped
+
+def import_cards(deck, user, upload, separator):
+    """
+    Adds the cards of the uploaded file to the deck in batches, all or
+    nothing. Returns the number of imported cards.
+    """
+    count = 0
+    with transaction.atomic():
+        batch = []
+        for line, front_side, back_side in read_cards(codecs.iterdecode(upload, 'utf-8-sig'), separator):
+            count += 1
+            if count > MAX_CARDS:
+                raise InvalidCards([{'line': line, 'error': "more than {} cards".format(MAX_CARDS)}])
+            batch.append(Flashcard(deck=deck, user=user, front_side=front_side, back_side=back_side))
+            if len(batch) == BATCH_SIZE:
+                _create(batch)
+                batch = []
+        _create(batch)
+    return count
+
+def _create(flashcards):
+    # bulk_create sends no post_save, create the review states and search vectors too
+    Flashcard.objects.bulk_create(flashcards)
+    Flashcard.update_search_vectors([flashcard.id for flashcard in flashcards])
+    ReviewState.objects.bulk_create([
+        ReviewState(user_id=flashcard.user_id, flashcard=flashcard, due=flashcard.created)
+        for flashcard in flashcards
+    ])
+
+def export_lines(deck, separator):
+    """
+    Yields the cards of the deck as lines of the given separator.
+    """
+    writer = csv.writer(_Echo(), delimiter=separator)
+    # rows with fields starting with # are quoted, so they are not read as headers
+    quoting_writer = csv.writer(_Echo(), delimiter=separator, quoting=csv.QUOTE_ALL)
+    if separator == '\t':
+        yield writer.writerow(['#separator:tab'])
+    for row in deck.flashcards.order_by('id').values_list('front_side', 'back_side').iterator(chunk_size=BATCH_SIZE):
+        if any(field.startswith('#') for field in row):
+            yield quoting_writer.writerow(row)
+        else:
+            yield writer.writerow(row)
+
+class _Echo:
+    # file like object for csv.writer, returns the written line instead of buffering it
+    def write(self, value):
+        return value
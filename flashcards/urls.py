@@ -9,6 +9,7 @@ app_name = 'flashcards'
 router = DefaultRouter(trailing_slash=False)
 router.register(r'cards', views.FlashcardViewSet, basename='card')
 router.register(r'decks', views.DeckViewSet, basename='deck')
+router.register(r'reviews', views.ReviewViewSet, basename='review')
 router.register(r'categories', views.CategoryViewSet, basename='category') # cards categories (not wiki categories)
 
 urlpatterns = [
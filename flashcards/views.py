@@ -3,18 +3,31 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.shortcuts import render, get_object_or_404
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.utils import timezone
 from wiki.models import Article
 
 from core.models import Submission
 
-from .models import Category, Flashcard, Deck
-from .serializers import CategorySerializer, FlashcardSerializer, DeckSerializer
+from .models import Category, Flashcard, Deck, ReviewState, SEARCH_CONFIG
+from .pagination import IdCursorPagination, SearchPagination
+from .scheduler import schedule
+from .transfer import InvalidCards, separator_for, import_cards, export_lines
+from .serializers import CategorySerializer, FlashcardSerializer, DeckSerializer, ReviewStateSerializer, ReviewSerializer, BatchReviewSerializer
+
+DUE_LIMIT = 20
+MAX_DUE_LIMIT = 100
+MAX_BATCH_REVIEWS = 500
 
 class FlashcardViewSet(viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing flashcards.
     """
     serializer_class = FlashcardSerializer
+    pagination_class = IdCursorPagination
 
     def get_permissions(self):
         if self.action == 'list':
@@ -28,14 +41,107 @@ class FlashcardViewSet(viewsets.ModelViewSet):
 
     def list(self, request):
         queryset = Flashcard.objects.filter(deck_id=self.request.GET['deck_id'])
-        serializer = FlashcardSerializer(queryset, many=True)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def due(self, request):
+        """
+        The next due cards of all decks of the user (?limit=20).
+        """
+        try:
+            limit = min(int(request.GET.get('limit', DUE_LIMIT)), MAX_DUE_LIMIT)
+        except ValueError:
+            limit = DUE_LIMIT
+        queryset = (ReviewState.objects
+                    .filter(user=request.user, due__lte=timezone.now())
+                    .order_by('due')
+                    .select_related('flashcard')[:limit])
+        serializer = ReviewStateSerializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full text search in the own cards and the cards of approved
+        decks (?q=...&page=1).
+        """
+        query = SearchQuery(request.GET.get('q', ''), config=SEARCH_CONFIG, search_type='websearch')
+        queryset = (Flashcard.objects
+                    .filter(Q(user=request.user) | Q(deck__approved=True), search_vector=query)
+                    .annotate(rank=SearchRank(F('search_vector'), query))
+                    .order_by('-rank', 'id'))
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def review(self, request, pk):
+        """
+        Records a review of the card: {"grade": 0-5, "reviewed": optional timestamp}
+        """
+        flashcard = self.get_object()
+        serializer = ReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        state, _ = ReviewState.objects.get_or_create(user=request.user, flashcard=flashcard,
+                                                     defaults={'due': flashcard.created})
+        schedule(state, serializer.validated_data['grade'],
+                 serializer.validated_data.get('reviewed', timezone.now()))
+        state.save()
+        return Response(ReviewStateSerializer(state).data)
+
+class ReviewViewSet(viewsets.GenericViewSet):
+    """
+    Reviews recorded by study sessions.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """
+        Records many reviews at once: [{"card": id, "grade": 0-5, "reviewed": timestamp}]
+        or [[id, grade, timestamp]]. Reviews not newer than the last recorded
+        review of their card are skipped, so sending a batch again is harmless.
+        At most MAX_BATCH_REVIEWS reviews per batch.
+        """
+        if isinstance(request.data, list) and len(request.data) > MAX_BATCH_REVIEWS:
+            return Response({'error': "more than {} reviews".format(MAX_BATCH_REVIEWS)}, status=400)
+        serializer = BatchReviewSerializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        reviews = sorted(serializer.validated_data, key=lambda review: review['reviewed'])
+
+        card_ids = {review['card'] for review in reviews}
+        with transaction.atomic():
+            states = {state.flashcard_id: state for state in (ReviewState.objects
+                      .select_for_update()
+                      .filter(user=request.user, flashcard__user=request.user, flashcard_id__in=card_ids))}
+            missing = card_ids - states.keys()
+            if missing:
+                return Response({'missing': sorted(missing)}, status=404)
+
+            changed = {}
+            applied = 0
+            for review in reviews:
+                state = states[review['card']]
+                if state.reviewed and review['reviewed'] <= state.reviewed:
+                    continue
+                schedule(state, review['grade'], review['reviewed'])
+                changed[state.id] = state
+                applied += 1
+
+            ReviewState.objects.bulk_update(changed.values(), ['ease', 'interval', 'repetitions', 'lapses', 'due', 'reviewed'])
+
+        return Response({'applied': applied, 'skipped': len(reviews) - applied})
+
 class DeckViewSet(viewsets.ModelViewSet):
     """
     ViewSet for viewing and editing decks.
     """
     serializer_class = DeckSerializer
+    pagination_class = IdCursorPagination
 
     def get_permissions(self):
         if self.action == 'for_wiki':
@@ -45,7 +151,10 @@ class DeckViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
 
     def get_queryset(self):
-        return Deck.objects.filter(user=self.request.user)
+        queryset = Deck.objects.filter(user=self.request.user).select_related('user')
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_progress(self.request.user)
+        return queryset
 
     @action(detail=False, methods=['get'])
     def for_wiki(self, request):
@@ -53,8 +162,9 @@ class DeckViewSet(viewsets.ModelViewSet):
             queryset = Deck.objects.filter(submission__isnull=False, wiki_category_id=self.request.GET['article_id'])
         else:
             queryset = Deck.objects.filter(approved=True, wiki_category_id=self.request.GET['article_id'])
-        serializer = DeckSerializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset.select_related('user'))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['put'])
     def submit(self, request, pk):
@@ -72,9 +182,47 @@ class DeckViewSet(viewsets.ModelViewSet):
         obj.save()
         return Response({'submission': obj.submission.id})
 
+    @action(detail=True, methods=['post'], url_path='import')
+    def import_cards(self, request, pk):
+        """
+        Adds the cards of an uploaded CSV or tab separated (Anki) file:
+        file=..., separator=comma|tab (by default from the file name).
+        """
+        deck = self.get_object()
+        error = deck.edit_error(request.user)
+        if error:
+            return Response({'error': error}, status=403)
+
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': "file missing"}, status=400)
+
+        separator = separator_for(request.data.get('separator'), upload.name)
+        try:
+            count = import_cards(deck, request.user, upload, separator)
+        except InvalidCards as e:
+            return Response({'errors': e.errors}, status=400)
+        except UnicodeDecodeError:
+            return Response({'error': "file is not UTF-8 encoded"}, status=400)
+        return Response({'imported': count}, status=201)
+
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk):
+        """
+        Streams the cards of an own or approved deck as CSV or tab separated
+        file (?separator=comma|tab).
+        """
+        deck = get_object_or_404(Deck.objects.filter(Q(user=request.user) | Q(approved=True)), pk=pk)
+        separator = separator_for(request.GET.get('separator'))
+        extension, content_type = ('tsv', 'text/tab-separated-values') if separator == '\t' else ('csv', 'text/csv')
+        response = StreamingHttpResponse(export_lines(deck, separator), content_type=content_type + '; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="deck-{}.{}"'.format(deck.id, extension)
+        return response
+
 class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IdCursorPagination
 
     def get_queryset(self):
         return Category.objects.filter(user=self.request.user)
@@ -0,0 +1,14 @@
+import axios from "axios";
+
+// list endpoints are cursor paginated, follow the next links
+async function getAll(url) {
+  let results = [];
+  while (url) {
+    const response = await axios.get(url);
+    results = results.concat(response.data.results);
+    url = response.data.next;
+  }
+  return results;
+}
+
+export { getAll }
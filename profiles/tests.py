@@ -3,6 +3,7 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 
 from wiki.models import Article, ArticleRevision, URLPath
+from quiz.models import Quiz
 from tandem_exams.models import *
 
 class BookmarkViewTestCase(TestCase):
@@ -74,6 +75,13 @@ class ViewTestCase(TestCase):
         self.assertRedirects(response, '/profile/login/?next=/profile/quizzes/', status_code=302,
                              target_status_code=200, fetch_redirect_response=True)
 
+    def test_quiz_summary_of_other_user(self):
+        self.client.force_login(self.user)
+        other = User.objects.create(username='other')
+        quiz = Quiz.objects.create(user=other)
+        response = self.client.get("/profile/quiz/{}".format(quiz.id))
+        self.assertEqual(response.status_code, 404)
+
     def test_quizzes_response(self):
         self.client.force_login(self.user)
         response = self.client.get("/profile/quizzes/")
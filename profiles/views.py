@@ -1,4 +1,4 @@
-from django.shortcuts import render
+from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.models import User
 from django.shortcuts import redirect
 from django.contrib.auth import authenticate, login as auth_login, logout as auth_logout
@@ -12,7 +12,9 @@ from wiki.models import ArticleRevision
 from wiki.models.article import Article
 
 from core.models import Submission, Profile
-from quiz.models import Quiz, UserAnswer
+from core.wiki_index import article_paths
+from quiz.models import Quiz
+from quiz.scoring import summarize_quiz
 from tandem_exams.models import *
 from tandem_exams.forms import *
 from .forms import SignupForm
@@ -31,9 +33,14 @@ def index(request):
 
 @login_required
 def bookmarks(request):
+    article_ids = list(request.user.bookmarks
+                       .filter(content_type=ContentType.objects.get_for_model(Article))
+                       .order_by('-created')
+                       .values_list('content_id', flat=True))
+    paths = article_paths(article_ids)
     return render(request, "profiles/bookmarks.html", {
         "banner": "/media/images/login.original.jpg",
-        "bookmarks": request.user.bookmarks.order_by('-created').all()
+        "articles": [paths[id] for id in article_ids if id in paths],
     })
 
 @login_required
@@ -77,16 +84,15 @@ def quizzes(request):
         query = query.order_by('-created')
     elif order_by == 'created-old':
         query = query.order_by('created')
-    # FIXME: order by score is not implemented
     elif order_by == 'score-high':
-        query = query.order_by('created')
+        query = query.order_by('-score', '-created')
     elif order_by == 'score-low':
-        query = query.order_by('created')
+        query = query.order_by('score', '-created')
     else:
         query = query
 
     #quizzes = Quiz.objects.filter(user__id=request.user.id).order_by('-created')
-    quizzes = query.all()
+    quizzes = query.select_related('category__current_revision')
     return render(request, "profiles/quizzes.html", {
         "banner": "/media/images/login.original.jpg",
         "quizzes": quizzes,
@@ -117,42 +123,12 @@ def tandem_exams(request, id=None, form=None):
 
 @login_required
 def quiz_summary(request, id):
-    quiz = Quiz.objects.get(pk=id)
-
-    quiz_summary = []
-
-    user_answers = UserAnswer.objects.filter(quiz=quiz)
-
-    for user_answer in user_answers:
-        # FIXME: this does not work as the users answers are not saved
-        # for choice in get_choices(user_answer):
-        for choice in user_answer.choice_set.all():
-            title = choice.answer.question_version.title
-            ans_val = choice.answer
-            found_val = [dictionary for dictionary in quiz_summary if dictionary["question"] == title]
-            rep_index = next((index for (index, dictionary) in enumerate(quiz_summary) if dictionary["question"] == title), None)
-            if len(found_val):
-                #The list is not empty
-                ans_list = quiz_summary[rep_index]["answer"]
-                ans_list.append(ans_val)
-                ans_list = list(dict.fromkeys(ans_list))
-                quiz_summary[rep_index] = dict(
-                    question=title,
-                    answer=ans_list
-                )
-
-            else:
-                quiz_summary.append(
-                    dict(
-                        question=title,
-                        answer=[ans_val]
-                    )
-                )
+    quiz = get_object_or_404(Quiz.objects.select_related('category__current_revision'), pk=id, user=request.user)
 
     return render(request, "profiles/quiz_summary.html", {
         "banner": "/media/images/login.original.jpg",
         "quiz": quiz,
-        "quiz_summary": quiz_summary
+        "quiz_summary": summarize_quiz(quiz),
     })
 
 def register(request):
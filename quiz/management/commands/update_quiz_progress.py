@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from quiz.models import Quiz
+from quiz.scoring import score_quizzes, count_answers
+
+class Command(BaseCommand):
+    help = "Backfills (or verifies) the materialized score, answered_count and total_questions of quizzes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true',
+                            help="only report quizzes with outdated progress, don't write")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        verify = options['verify']
+        quiz_ids = list(Quiz.objects.order_by('id').values_list('id', flat=True))
+        outdated = 0
+
+        for start in range(0, len(quiz_ids), batch_size):
+            batch = quiz_ids[start:start + batch_size]
+            scores = score_quizzes(batch)
+            answers = count_answers(batch)
+
+            changed = []
+            for quiz in Quiz.objects.filter(id__in=batch).only('id', 'score', 'answered_count', 'total_questions'):
+                score, total = scores[quiz.id]
+                progress = (score, answers.get(quiz.id, 0), total)
+                if progress == (quiz.score, quiz.answered_count, quiz.total_questions):
+                    continue
+
+                if verify:
+                    self.stdout.write("quiz {}: stored {} != calculated {}".format(
+                        quiz.id, (quiz.score, quiz.answered_count, quiz.total_questions), progress))
+                quiz.score, quiz.answered_count, quiz.total_questions = progress
+                changed.append(quiz)
+
+            outdated += len(changed)
+            if not verify:
+                Quiz.objects.bulk_update(changed, ['score', 'answered_count', 'total_questions'])
+
+        if verify:
+            self.stdout.write("{} of {} quizzes outdated".format(outdated, len(quiz_ids)))
+        else:
+            self.stdout.write(self.style.SUCCESS("updated {} of {} quizzes".format(outdated, len(quiz_ids))))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from quiz.statistics import update_statistics
+
+class Command(BaseCommand):
+    help = "Adds the answers given since the last run to the quiz statistics"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        added = update_statistics(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("added {} answers to the statistics".format(added)))
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.5 on 2026-10-18 10:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wiki', '0003_mptt_upgrade'),
+        ('quiz', '0005_quiz_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryQuestions',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='wiki.article')),
+                ('question_ids', models.JSONField(default=list)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.5 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0006_categoryquestions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='question_ids',
+            field=models.JSONField(default=list),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.5 on 2026-10-18 13:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import modelcluster.fields
+
+
+def link_answers(apps, schema_editor):
+    # every existing answer belongs to the version which added it
+    AnswerVersion = apps.get_model('quiz', 'AnswerVersion')
+    QuestionVersion = apps.get_model('quiz', 'QuestionVersion')
+    Through = QuestionVersion.answers.through
+    Through.objects.bulk_create(
+        (Through(questionversion_id=question_version_id, answerversion_id=answer_id)
+         for answer_id, question_version_id in AnswerVersion.objects.values_list('id', 'question_version_id').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0008_statistics'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answerversion',
+            name='question_version',
+            field=modelcluster.fields.ParentalKey(on_delete=django.db.models.deletion.CASCADE, related_name='own_answers', to='quiz.questionversion'),
+        ),
+        migrations.AddField(
+            model_name='questionversion',
+            name='answers',
+            field=models.ManyToManyField(blank=True, related_name='question_versions', to='quiz.AnswerVersion'),
+        ),
+        migrations.RunPython(link_answers, migrations.RunPython.noop),
+    ]
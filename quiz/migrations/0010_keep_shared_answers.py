@@ -0,0 +1,20 @@
+# Generated by Django 3.2.5 on 2026-10-19 09:00
+
+from django.db import migrations
+import modelcluster.fields
+import quiz.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0009_shared_answers'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answerversion',
+            name='question_version',
+            field=modelcluster.fields.ParentalKey(on_delete=quiz.models.keep_shared_answers, related_name='own_answers', to='quiz.questionversion'),
+        ),
+    ]
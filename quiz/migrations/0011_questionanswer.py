@@ -0,0 +1,41 @@
+# Generated by Django 3.2.5 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quiz', '0010_keep_shared_answers'),
+    ]
+
+    operations = [
+        # the through model of QuestionVersion.answers keeps the table of the implicit one
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='QuestionAnswer',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('answerversion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.answerversion')),
+                        ('questionversion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quiz.questionversion')),
+                    ],
+                    options={
+                        'db_table': 'quiz_questionversion_answers',
+                        'unique_together': {('questionversion', 'answerversion')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='questionversion',
+                    name='answers',
+                    field=models.ManyToManyField(blank=True, related_name='question_versions', through='quiz.QuestionAnswer', to='quiz.AnswerVersion'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='questionanswer',
+            name='position',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
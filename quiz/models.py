@@ -1,10 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from modelcluster.fields import ParentalKey
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from modelcluster.models import ClusterableModel
 from wagtail.admin.edit_handlers import FieldPanel, InlinePanel
+from wagtail.admin.forms import WagtailAdminModelForm
 from wiki.models import URLPath
 
+from core.cache import bump_generation
 from core.edit_handlers import ReadOnlyPanel
 
 import json
@@ -28,34 +33,112 @@ class Question(ClusterableModel):
         InlinePanel('questions',heading='Question versions'),
     ]
 
+class QuestionVersionQuerySet(models.QuerySet):
+    def current(self):
+        """
+        Current versions of approved questions.
+        """
+        return self.filter(current_version__approved=True)
+
+    def with_is_current(self):
+        """
+        Annotates is_current_version, read by QuestionVersion.is_current.
+        """
+        return self.annotate(is_current_version=models.Exists(
+            Question.objects.filter(current=models.OuterRef('pk'), approved=True)
+        ))
+
+class QuestionVersionForm(WagtailAdminModelForm):
+    def clean(self):
+        # answers shared with other versions (QuestionVersion.answers) are
+        # read only, changing them would change those versions and past quizzes
+        cleaned_data = super().clean()
+        forms = [form for form in self.formsets['own_answers'].forms if form.instance.pk and form.has_changed()]
+        shared = set(QuestionAnswer.objects
+                     .filter(answerversion__in=[form.instance.pk for form in forms])
+                     .exclude(questionversion=self.instance.pk)
+                     .values_list('answerversion', flat=True))
+        for form in forms:
+            if form.instance.pk in shared:
+                raise ValidationError("The answer \"{}\" is used by other versions of the question and "
+                                      "can't be changed, add a new answer instead.".format(form.instance.text))
+        return cleaned_data
+
 class QuestionVersion(ClusterableModel):
 
     class Meta:
         verbose_name = "MCT Frage"
 
+    base_form_class = QuestionVersionForm
+
     question = ParentalKey(Question, on_delete=models.CASCADE, related_name='questions')
     title = models.TextField(max_length=1000)
     description = models.TextField(max_length=2000)
+    # answers are shared with other versions of the question as long as they are unchanged
+    answers = models.ManyToManyField('AnswerVersion', through='QuestionAnswer', related_name='question_versions', blank=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, blank=True, null=True)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
 
+    objects = QuestionVersionQuerySet.as_manager()
+
     def __str__(self):
         return str(self.id) + " | " + self.title + " | " + str(self.user) + " | " + str(self.created)
 
+    def ordered_answers(self):
+        return self.answers.order_by(*ANSWER_ORDER)
+
     def answers_json(self):
-        return json.dumps([{ "text": o.text, "correct": o.correct } for o in self.answers.all()])
+        return json.dumps([{ "text": o.text, "correct": o.correct } for o in self.ordered_answers()])
+
+    def answers_text(self):
+        return ", ".join(("✓ " if o.correct else "✗ ") + o.text for o in self.ordered_answers())
+
+    def set_answers(self, answers):
+        """
+        Sets the answers [{"text": ..., "correct": ...}] of this version.
+        Answers unchanged since the current (or else the latest) version of
+        the question are shared instead of copied.
+        """
+        previous = self.question.current or self.question.questions.exclude(id=self.id).order_by('-id').first()
+        unchanged = {}
+        if previous:
+            for answer in previous.answers.all():
+                unchanged.setdefault((answer.text, answer.correct), answer)
+
+        ordered = []
+        created = []
+        for answer in answers:
+            key = (answer.get("text"), bool(answer.get("correct")))
+            if key in unchanged:
+                ordered.append(unchanged.pop(key))
+            else:
+                created.append(AnswerVersion(question_version=self, text=key[0], correct=key[1]))
+                ordered.append(created[-1])
+
+        AnswerVersion.objects.bulk_create(created)
+        QuestionAnswer.objects.filter(questionversion=self).delete()
+        QuestionAnswer.objects.bulk_create([
+            QuestionAnswer(questionversion=self, answerversion=answer, position=position)
+            for position, answer in enumerate(ordered)
+        ])
 
     def approve(self):
-        self.question.approved = True
-        self.question.current = self
-        self.question.save()
+        """
+        Makes this the current version of its question (a single UPDATE).
+        """
+        question = self.question
+        Question.objects.filter(id=question.id).update(approved=True, current=self, updated=timezone.now())
+        question.approved = True
+        question.current = self
+        # an update does not send post_save, see quiz/signals.py
+        CategoryQuestions.invalidate([question.category_id])
+        bump_generation("quiz")
 
     def is_current(self):
-        if self.question.current:
-            return self.question.approved and (self.question.current.id == self.id)
-
-        return False
+        if hasattr(self, 'is_current_version'):
+            return self.is_current_version
+        return Question.objects.filter(current=self, approved=True).exists()
 
     panels = [
         ReadOnlyPanel('id', heading="Id"),
@@ -65,11 +148,48 @@ class QuestionVersion(ClusterableModel):
         ReadOnlyPanel('question', heading="Question"),
         FieldPanel('title'),
         FieldPanel('description'),
-        InlinePanel('answers',heading='Answers'),
+        ReadOnlyPanel('answers_text', heading="Answers"),
+        InlinePanel('own_answers', heading='Answers added in this version'),
     ]
 
+def keep_shared_answers(collector, field, sub_objs, using):
+    """
+    on_delete of AnswerVersion.question_version: answers still used by other
+    versions (QuestionVersion.answers) move to the latest of them instead of
+    being deleted with the version which added them.
+    """
+    deleted = {version.pk for version in collector.data.get(QuestionVersion, ())}
+    owners = dict(QuestionVersion.answers.through.objects.using(using)
+                  .filter(answerversion__in=[answer.pk for answer in sub_objs])
+                  .exclude(questionversion__in=deleted)
+                  .values('answerversion')
+                  .annotate(owner=models.Max('questionversion'))
+                  .values_list('answerversion', 'owner'))
+    kept = {}
+    for answer in sub_objs:
+        if answer.pk in owners:
+            kept.setdefault(owners[answer.pk], []).append(answer)
+    for owner, answers in kept.items():
+        collector.add_field_update(field, owner, answers)
+    models.CASCADE(collector, field, [answer for answer in sub_objs if answer.pk not in owners], using)
+
+class QuestionAnswer(models.Model):
+    # the answers of a version in the order they were entered
+    # (QuestionVersion.answers), the table of the former implicit through model
+    class Meta:
+        db_table = 'quiz_questionversion_answers'
+        unique_together = [('questionversion', 'answerversion')]
+
+    questionversion = models.ForeignKey(QuestionVersion, on_delete=models.CASCADE)
+    answerversion = models.ForeignKey('AnswerVersion', on_delete=models.CASCADE)
+    position = models.PositiveIntegerField(default=0)
+
+# order of QuestionVersion.answers, answers linked before positions existed keep their id order
+ANSWER_ORDER = ('questionanswer__position', 'id')
+
 class AnswerVersion(ClusterableModel):
-    question_version = ParentalKey(QuestionVersion, on_delete=models.CASCADE, related_name='answers')
+    # the version which added the answer, see QuestionVersion.answers for all versions using it
+    question_version = ParentalKey(QuestionVersion, on_delete=keep_shared_answers, related_name='own_answers')
     text = models.TextField()
     correct = models.BooleanField(default=False)
 
@@ -77,52 +197,116 @@ class AnswerVersion(ClusterableModel):
         return self.text
 
 
-class Quiz(models.Model):
+class QuizNavigationMixin:
+    """
+    Navigation through the ordered question ids of a quiz. Expects
+    question_ids and category_id attributes.
+    """
+
+    def get_question_ids(self):
+        # quizzes started before snapshots existed use the current questions of the category
+        if not self.question_ids:
+            self.question_ids = CategoryQuestions.for_category(self.category_id)
+        return self.question_ids
+
+    def question_position(self, question_id):
+        """
+        Returns the position (starting at 1) of the question in the quiz or
+        None if the question is not part of it.
+        """
+        if not hasattr(self, '_positions'):
+            self._positions = {id: position for position, id in enumerate(self.get_question_ids(), start=1)}
+        return self._positions.get(question_id)
+
+    def next_question_id(self, question_id):
+        question_ids = self.get_question_ids()
+        position = self.question_position(question_id)
+        if position is None:
+            return next((id for id in question_ids if id > question_id), None)
+        return question_ids[position] if position < len(question_ids) else None
+
+    def previous_question_id(self, question_id):
+        question_ids = self.get_question_ids()
+        position = self.question_position(question_id)
+        if position is None:
+            return next((id for id in reversed(question_ids) if id < question_id), None)
+        return question_ids[position - 2] if position > 1 else None
+
+class Quiz(QuizNavigationMixin, models.Model):
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'score'], name='quiz_quiz_user_score_idx'),
+        ]
+
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     category = models.ForeignKey('wiki.Article', on_delete=models.SET_NULL, null=True, blank=True)
     completed = models.BooleanField(default=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
+    # materialized progress, see store_answers and update_progress
+    score = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+    total_questions = models.PositiveIntegerField(default=0)
+    # ordered question ids, snapshotted when the quiz is started
+    question_ids = models.JSONField(default=list)
 
     def calculate_score(self):
-        if self.useranswer_set:
-            user_answers = self.useranswer_set.all()
-            x = {}
-            y = {}
+        from .scoring import calculate_scores
+        return calculate_scores([self.id]).get(self.id, 0)
 
-            total = 0
+    def store_answers(self, answers):
+        """
+        Stores the chosen answers {question_id: [answer ids]} with one bulk
+        insert per table and updates score and answered_count. Answer ids not
+        belonging to the current version of their question are ignored.
+        Questions answered before (back button, repeated submit) keep only
+        the new answer, like SessionQuiz.store_answers.
 
-            for user_answer in user_answers:
-                answers = set()
-                uanswers = set()
+        Returns {question_id: answered correctly}.
+        """
+        from .scoring import check_answers, correct_user_answers
+        from .statistics import remove_answers
+        checked = check_answers(answers)
 
-                for q_ver in user_answer.question.questions.all():
-                    for answer in q_ver.answers.all():
-                        if answer.correct:
-                            answers.add(answer.id)
-
-                for choice in user_answer.choice_set.all():
-                    uanswers.add(choice.answer.id)
-
-                # real answers
-                x[user_answer.question.id] = answers
-                # user answers
-                y[user_answer.question.id] = uanswers
-
-                if y[user_answer.question.id] == x[user_answer.question.id]:
-                    total += 1
-
-            return total
+        results = {}
+        choices = []
+        with transaction.atomic():
+            # the replaced answers no longer count for score and answered_count
+            replaced = list(UserAnswer.objects
+                            .filter(quiz=self, question_id__in=list(checked))
+                            .values_list('id', 'question_id'))
+            replaced_ids = [id for id, _ in replaced]
+            replaced_correct = len(correct_user_answers(replaced)) if replaced else 0
+            if replaced:
+                remove_answers(replaced_ids)
+                Choice.objects.filter(user_answer_id__in=replaced_ids).delete()
+                UserAnswer.objects.filter(id__in=replaced_ids).delete()
+            user_answers = UserAnswer.objects.bulk_create([
+                UserAnswer(quiz=self, question_id=question_id) for question_id in checked
+            ])
+            for user_answer in user_answers:
+                answer_ids, results[user_answer.question_id] = checked[user_answer.question_id]
+                choices += [Choice(user_answer=user_answer, answer_id=answer_id) for answer_id in answer_ids]
+            Choice.objects.bulk_create(choices)
+            Quiz.objects.filter(pk=self.pk).update(
+                score=Greatest(models.F('score') + sum(results.values()) - replaced_correct, 0),
+                answered_count=Greatest(models.F('answered_count') + len(results) - len(replaced), 0),
+            )
+        return results
 
-    def total_questions(self):
-        return self.get_questions_for_category().count()
+    def update_progress(self, save=True):
+        """
+        Recalculates score, answered_count and total_questions from the raw answers.
+        """
+        from .scoring import score_quizzes, count_answers
+        self.score, self.total_questions = score_quizzes([self.id]).get(self.id, (0, 0))
+        self.answered_count = count_answers([self.id]).get(self.id, 0)
+        if save:
+            self.save(update_fields=['score', 'answered_count', 'total_questions'])
 
     def get_questions_for_category(self):
-        path = URLPath.objects.get(article=self.category.id)
-        ids = [path.article.id for path in path.get_descendants()]
-        # Get questions
-        questions = Question.objects.filter(category_id=self.category.id) | Question.objects.filter(category_id__in=ids)
-        return questions.order_by('id')
+        return Question.objects.filter(id__in=CategoryQuestions.for_category(self.category_id)).order_by('id')
 
 class UserAnswer(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
@@ -133,3 +317,103 @@ class UserAnswer(models.Model):
 class Choice(models.Model):
     user_answer = models.ForeignKey(UserAnswer, null=True, on_delete=models.SET_NULL)
     answer = models.ForeignKey(AnswerVersion, null=True, on_delete=models.SET_NULL)
+
+class CategoryQuestions(models.Model):
+    """
+    Materialized, ordered list of the approved and current questions of a
+    wiki article and all of its descendants. Entries are deleted by the
+    signals in quiz/signals.py and rebuilt on the next lookup, so it serves
+    lookups of single categories (quizzes, scoring). The wiki tree snapshot
+    (core.wiki_tree) sums the questions of all articles in one query.
+    """
+    category = models.OneToOneField('wiki.Article', on_delete=models.CASCADE, primary_key=True, related_name='+')
+    question_ids = models.JSONField(default=list)
+    updated = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def lookup(cls, category_ids):
+        """
+        Returns {category_id: [question ids]}, rebuilding missing entries.
+        """
+        category_ids = {category_id for category_id in category_ids if category_id}
+        result = dict(cls.objects.filter(category_id__in=category_ids).values_list('category_id', 'question_ids'))
+        for category_id in category_ids - result.keys():
+            result[category_id] = cls.rebuild(category_id)
+        return result
+
+    @classmethod
+    def for_category(cls, category_id):
+        return cls.lookup([category_id]).get(category_id, [])
+
+    @classmethod
+    def rebuild(cls, category_id):
+        path = URLPath.objects.filter(article_id=category_id).first()
+        if path:
+            article_ids = path.get_descendants(include_self=True).values_list('article_id', flat=True)
+        else:
+            article_ids = [category_id]
+
+        question_ids = list(Question.objects
+                            .filter(category_id__in=article_ids, approved=True, current__isnull=False)
+                            .order_by('id')
+                            .values_list('id', flat=True))
+        cls.objects.update_or_create(category_id=category_id, defaults={'question_ids': question_ids})
+        return question_ids
+
+    @classmethod
+    def invalidate(cls, category_ids=None):
+        """
+        Deletes the entries of the given articles and all their ancestors
+        (all entries if no articles are given).
+        """
+        if category_ids is None:
+            cls.objects.all().delete()
+            return
+
+        article_ids = {category_id for category_id in category_ids if category_id}
+        for path in URLPath.objects.filter(article_id__in=article_ids):
+            article_ids.update(path.get_ancestors().values_list('article_id', flat=True))
+        cls.objects.filter(category_id__in=article_ids).delete()
+
+class QuestionStatistics(models.Model):
+    """
+    Aggregated answers of a question, maintained incrementally by
+    quiz.statistics.update_statistics.
+    """
+    class Meta:
+        verbose_name = "MCT Statistik"
+        verbose_name_plural = "MCT Statistiken"
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='statistics')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+
+    def correct_rate(self):
+        return round(100 * self.correct / self.attempts) if self.attempts else None
+
+class AnswerStatistics(models.Model):
+    answer = models.OneToOneField(AnswerVersion, on_delete=models.CASCADE, primary_key=True, related_name='statistics')
+    selected = models.PositiveIntegerField(default=0)
+
+class CategoryStatistics(models.Model):
+    """
+    Aggregated answers of the questions of a category (without descendants).
+    """
+    class Meta:
+        verbose_name = "MCT Kategorie Statistik"
+        verbose_name_plural = "MCT Kategorie Statistiken"
+
+    category = models.OneToOneField('wiki.Article', on_delete=models.CASCADE, primary_key=True, related_name='+')
+    attempts = models.PositiveIntegerField(default=0)
+    correct = models.PositiveIntegerField(default=0)
+
+    def correct_rate(self):
+        return round(100 * self.correct / self.attempts) if self.attempts else None
+
+class StatisticsWatermark(models.Model):
+    """
+    Id of the last UserAnswer included in the statistics.
+    """
+    name = models.CharField(max_length=50, primary_key=True)
+    last_id = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
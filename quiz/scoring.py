@@ -0,0 +1,192 @@
+"""
+Set based scoring of quizzes.
+
+Instead of walking user answers -> question versions -> answers -> choices
+row by row, all data needed to score any number of quizzes is loaded with a
+fixed number of queries and compared in memory.
+
+A question counts as answered correctly if the set of chosen answers equals
+the set of correct answers of the current version of the question.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, Prefetch
+
+from .models import Question, QuestionVersion, AnswerVersion, Quiz, UserAnswer, Choice, CategoryQuestions, ANSWER_ORDER
+
+def score_quizzes(quiz_ids):
+    """
+    Returns {quiz_id: (score, total)} for the given quizzes.
+    """
+    quiz_ids = list(quiz_ids)
+    if not quiz_ids:
+        return {}
+
+    quizzes = list(Quiz.objects.filter(id__in=quiz_ids).values_list('id', 'category_id', 'question_ids'))
+    scores = calculate_scores([quiz_id for quiz_id, _, _ in quizzes])
+    # quizzes without a snapshot of their questions count the current questions of the category
+    totals = count_questions({category_id for _, category_id, question_ids in quizzes if not question_ids})
+
+    return {
+        quiz_id: (scores.get(quiz_id, 0), len(question_ids) if question_ids else totals.get(category_id, 0))
+        for quiz_id, category_id, question_ids in quizzes
+    }
+
+def calculate_scores(quiz_ids):
+    """
+    Returns {quiz_id: score} for the given quizzes (3 queries).
+    """
+    user_answers = list(UserAnswer.objects
+                        .filter(quiz_id__in=quiz_ids)
+                        .values_list('id', 'quiz_id', 'question_id'))
+
+    choices = defaultdict(set)
+    for user_answer_id, answer_id in (Choice.objects
+                                      .filter(user_answer__quiz_id__in=quiz_ids)
+                                      .values_list('user_answer_id', 'answer_id')):
+        choices[user_answer_id].add(answer_id)
+
+    question_ids = {question_id for _, _, question_id in user_answers}
+    correct = correct_answers(question_ids)
+
+    scores = defaultdict(int)
+    for user_answer_id, quiz_id, question_id in user_answers:
+        # question was deleted
+        if question_id is None:
+            continue
+        if choices[user_answer_id] == correct[question_id]:
+            scores[quiz_id] += 1
+    return scores
+
+def correct_user_answers(user_answers):
+    """
+    Returns the ids of the given (user answer id, question id) rows which
+    were answered correctly (2 queries).
+    """
+    choices = defaultdict(set)
+    for user_answer_id, answer_id in (Choice.objects
+                                      .filter(user_answer_id__in=[id for id, _ in user_answers])
+                                      .values_list('user_answer_id', 'answer_id')):
+        choices[user_answer_id].add(answer_id)
+    correct = correct_answers({question_id for _, question_id in user_answers})
+    return {id for id, question_id in user_answers if question_id is not None and choices[id] == correct[question_id]}
+
+def count_answers(quiz_ids):
+    """
+    Returns {quiz_id: number of answered questions} (1 query).
+    """
+    return dict(UserAnswer.objects
+                .filter(quiz_id__in=quiz_ids)
+                .values('quiz_id')
+                .annotate(count=Count('id'))
+                .values_list('quiz_id', 'count'))
+
+def correct_answers(question_ids):
+    """
+    Returns {question_id: set of correct answer ids of the current version}
+    (1 query).
+    """
+    correct = defaultdict(set)
+    for question_id, answer_id in (AnswerVersion.objects
+                                   .filter(question_versions__current_version__in=question_ids, correct=True)
+                                   .values_list('question_versions__current_version', 'id')):
+        correct[question_id].add(answer_id)
+    return correct
+
+def check_answers(answers):
+    """
+    Checks the chosen answers {question_id: [answer ids]} (2 queries). Answer
+    ids not belonging to the current version of their question are dropped.
+
+    Returns {question_id: (set of chosen answer ids, answered correctly)}.
+    """
+    question_ids = list(answers.keys())
+
+    valid = defaultdict(set)
+    for answer_id, question_id in (AnswerVersion.objects
+                                   .filter(question_versions__current_version__in=question_ids)
+                                   .values_list('id', 'question_versions__current_version')):
+        valid[question_id].add(answer_id)
+    correct = correct_answers(question_ids)
+
+    checked = {}
+    for question_id in question_ids:
+        answer_ids = valid[question_id] & {int(id) for id in answers[question_id]}
+        checked[question_id] = (answer_ids, answer_ids == correct[question_id])
+    return checked
+
+def count_questions(category_ids):
+    """
+    Returns {category_id: number of questions} for the given wiki articles,
+    including the questions of all descendant articles (1 query).
+    """
+    return {
+        category_id: len(question_ids)
+        for category_id, question_ids in CategoryQuestions.lookup(category_ids).items()
+    }
+
+def summarize_quiz(quiz):
+    """
+    Returns the answered questions of the quiz in quiz order (6 queries):
+
+        [{"question": QuestionVersion, "correct": bool,
+          "answers": [{"answer": AnswerVersion, "chosen": bool}]}]
+
+    The shown version is the current one if it contains all chosen answers,
+    otherwise the version which added the chosen answers. A question answered
+    more than once shows the last answer.
+    """
+    answered = {}
+    for user_answer_id, question_id in (UserAnswer.objects
+                                        .filter(quiz_id=quiz.id, question__isnull=False)
+                                        .order_by('id')
+                                        .values_list('id', 'question_id')):
+        answered[question_id] = user_answer_id
+
+    chosen = defaultdict(set)
+    added_in = {}
+    for user_answer_id, answer_id, version_id in (Choice.objects
+                                                  .filter(user_answer_id__in=answered.values(), answer__isnull=False)
+                                                  .values_list('user_answer_id', 'answer_id', 'answer__question_version_id')):
+        chosen[user_answer_id].add(answer_id)
+        added_in[user_answer_id] = max(version_id, added_in.get(user_answer_id, 0))
+
+    current = dict(Question.objects.filter(id__in=answered.keys()).values_list('id', 'current_id'))
+
+    version_ids = set(added_in.values()) | set(current.values())
+    question_versions = (QuestionVersion.objects
+                         .filter(id__in=version_ids)
+                         .prefetch_related(Prefetch('answers', queryset=AnswerVersion.objects.order_by(*ANSWER_ORDER)))
+                         .in_bulk())
+    correct = correct_answers(answered.keys())
+
+    def answered_version(question_id):
+        # answers are shared between versions, prefer the current version if it has all chosen answers
+        user_answer_id = answered[question_id]
+        candidates = [question_versions.get(current.get(question_id)), question_versions.get(added_in.get(user_answer_id))]
+        candidates = [version for version in candidates if version]
+        for version in candidates:
+            if chosen[user_answer_id] <= {answer.id for answer in version.answers.all()}:
+                return version
+        return candidates[-1] if candidates else None
+
+    question_ids = list(answered)
+    if quiz.question_ids:
+        # questions missing in the snapshot keep their answer order at the end
+        question_ids.sort(key=lambda id: quiz.question_position(id) or len(quiz.question_ids) + 1)
+
+    summary = []
+    for question_id in question_ids:
+        user_answer_id = answered[question_id]
+        question_version = answered_version(question_id)
+        if question_version is None:
+            continue
+        summary.append({
+            "question": question_version,
+            "correct": chosen[user_answer_id] == correct[question_id],
+            "answers": [{
+                "answer": answer,
+                "chosen": answer.id in chosen[user_answer_id],
+            } for answer in question_version.answers.all()],
+        })
+    return summary
@@ -35,7 +35,8 @@ class QuestionSerializer(serializers.Serializer):
 class QuizSerializer(serializers.ModelSerializer):
     class Meta:
         model = Quiz
-        fields = ['id', 'user', 'category', 'completed', 'created', 'updated']
+        fields = ['id', 'user', 'category', 'completed', 'created', 'updated', 'score', 'answered_count', 'total_questions']
+        read_only_fields = ['score', 'answered_count', 'total_questions']
 
 
 class UserAnswerSerializer(serializers.ModelSerializer):
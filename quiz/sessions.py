@@ -0,0 +1,113 @@
+"""
+Quizzes of anonymous visitors are kept in their session, nothing is written
+to the Quiz, UserAnswer and Choice tables. When the visitor logs in, the
+session quizzes are moved to real quizzes of the user (see adopt).
+"""
+from django.db import transaction
+from wiki.models import Article
+
+from .models import Quiz, QuizNavigationMixin
+from .scoring import check_answers
+
+SESSION_KEY = "quizzes"
+
+class SessionQuiz(QuizNavigationMixin):
+    """
+    Session backed quiz with the interface of Quiz used by the quiz views.
+    There is one quiz per category, starting a quiz replaces the previous one.
+    """
+
+    def __init__(self, session, category_id, data):
+        self.session = session
+        self.category_id = category_id
+        self.data = data
+
+    @classmethod
+    def start(cls, session, category_id, question_ids):
+        quiz = cls(session, category_id, {
+            "question_ids": question_ids,
+            "answers": {},
+            "score": 0,
+            "completed": False,
+        })
+        quiz.save()
+        return quiz
+
+    @classmethod
+    def load(cls, session, category_id):
+        """
+        Returns the running (not completed) quiz of the category or None.
+        """
+        data = session.get(SESSION_KEY, {}).get(str(category_id))
+        if not data or data["completed"]:
+            return None
+        return cls(session, category_id, data)
+
+    @classmethod
+    def adopt(cls, session, user):
+        """
+        Moves all quizzes of the session to the given user.
+        """
+        quizzes = session.pop(SESSION_KEY, {})
+        categories = set(Article.objects.filter(id__in=[int(id) for id in quizzes]).values_list('id', flat=True))
+
+        with transaction.atomic():
+            for category_id, data in quizzes.items():
+                if int(category_id) not in categories:
+                    continue
+                quiz = Quiz.objects.create(
+                    user=user,
+                    category_id=int(category_id),
+                    completed=data["completed"],
+                    question_ids=data["question_ids"],
+                    total_questions=len(data["question_ids"]),
+                )
+                quiz.store_answers({int(question_id): answer["answers"] for question_id, answer in data["answers"].items()})
+
+    @property
+    def question_ids(self):
+        return self.data["question_ids"]
+
+    @question_ids.setter
+    def question_ids(self, question_ids):
+        self.data["question_ids"] = question_ids
+
+    @property
+    def completed(self):
+        return self.data["completed"]
+
+    @completed.setter
+    def completed(self, completed):
+        self.data["completed"] = completed
+
+    @property
+    def score(self):
+        return self.data["score"]
+
+    @property
+    def answered_count(self):
+        return len(self.data["answers"])
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+    def store_answers(self, answers):
+        """
+        Same as Quiz.store_answers, but stores the answers in the session.
+        """
+        results = {}
+        for question_id, (answer_ids, correct) in check_answers(answers).items():
+            previous = self.data["answers"].get(str(question_id))
+            if previous:
+                # answered again, replace the previous answer
+                self.data["score"] -= int(previous["correct"])
+            self.data["answers"][str(question_id)] = {"answers": sorted(answer_ids), "correct": correct}
+            self.data["score"] += int(correct)
+            results[question_id] = correct
+        self.save()
+        return results
+
+    def save(self, **kwargs):
+        self.session.setdefault(SESSION_KEY, {})[str(self.category_id)] = self.data
+        self.session.modified = True
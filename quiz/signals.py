@@ -0,0 +1,43 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from mptt.signals import node_moved
+from wiki.models import URLPath
+
+from core.cache import bump_generation
+
+from .models import Question, AnswerVersion, CategoryQuestions
+from .sessions import SessionQuiz
+
+@receiver(pre_save, sender=Question)
+def remember_question_category(sender, instance, **kwargs):
+    # the category may change, the old one has to be invalidated too
+    instance._previous_category_id = None
+    if instance.pk:
+        instance._previous_category_id = Question.objects.filter(pk=instance.pk).values_list('category_id', flat=True).first()
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question_categories(sender, instance, **kwargs):
+    CategoryQuestions.invalidate([instance.category_id, getattr(instance, '_previous_category_id', None)])
+    bump_generation("quiz")
+
+@receiver(post_save, sender=AnswerVersion)
+def add_answer_to_version(sender, instance, created, **kwargs):
+    # answers added through the admin belong to the version they were added in
+    if created:
+        question_version = instance.question_version
+        question_version.answers.add(instance, through_defaults={'position': question_version.answers.count()})
+
+@receiver(post_save, sender=URLPath)
+@receiver(post_delete, sender=URLPath)
+@receiver(node_moved, sender=URLPath)
+def invalidate_wiki_tree(sender, instance, **kwargs):
+    # wiki pages were added, moved or deleted
+    CategoryQuestions.invalidate()
+
+@receiver(user_logged_in)
+def adopt_session_quizzes(sender, request, user, **kwargs):
+    # quizzes taken before logging in are moved to the user
+    if request is not None and hasattr(request, 'session'):
+        SessionQuiz.adopt(request.session, user)
@@ -0,0 +1,107 @@
+"""
+Incremental quiz statistics.
+
+The statistics are kept as counters which are increased in batches by the
+UserAnswers added since the last run (the watermark). UserAnswers replaced
+by answering a question again are taken out of the counters by
+remove_answers if they were added already. Reading the statistics never
+touches the answer history.
+
+Run by the update_quiz_statistics management command.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserAnswer, Choice, QuestionStatistics, AnswerStatistics, CategoryStatistics, StatisticsWatermark
+from .scoring import correct_answers
+
+WATERMARK = "user_answers"
+# answers are stored in a transaction together with their choices, younger
+# answers could still be followed by ones with lower ids, skip them for now
+SETTLE_TIME = timedelta(minutes=1)
+
+def update_statistics(batch_size=1000):
+    """
+    Adds all settled UserAnswers newer than the watermark to the statistics.
+    Returns the number of added answers.
+    """
+    added = 0
+    while True:
+        with transaction.atomic():
+            watermark, _ = StatisticsWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+            user_answers = list(UserAnswer.objects
+                                .filter(id__gt=watermark.last_id, created__lt=timezone.now() - SETTLE_TIME)
+                                .order_by('id')
+                                .values_list('id', 'question_id', 'question__category_id')[:batch_size])
+            if not user_answers:
+                return added
+
+            aggregate(user_answers)
+            watermark.last_id = user_answers[-1][0]
+            watermark.save()
+
+        added += len(user_answers)
+
+def remove_answers(user_answer_ids):
+    """
+    Subtracts the UserAnswers which were added already, called in the
+    transaction which deletes them (Quiz.store_answers).
+    """
+    watermark, _ = StatisticsWatermark.objects.select_for_update().get_or_create(name=WATERMARK)
+    user_answers = list(UserAnswer.objects
+                        .filter(id__in=user_answer_ids, id__lte=watermark.last_id)
+                        .values_list('id', 'question_id', 'question__category_id'))
+    if user_answers:
+        aggregate(user_answers, sign=-1)
+
+def aggregate(user_answers, sign=1):
+    """
+    Adds (or with sign=-1 subtracts) the given (user answer id, question id,
+    category id) rows to the statistics (4 queries plus the writes).
+    """
+    choices = defaultdict(set)
+    for user_answer_id, answer_id in (Choice.objects
+                                      .filter(user_answer_id__in=[id for id, _, _ in user_answers], answer__isnull=False)
+                                      .values_list('user_answer_id', 'answer_id')):
+        choices[user_answer_id].add(answer_id)
+    correct = correct_answers({question_id for _, question_id, _ in user_answers})
+
+    questions = defaultdict(lambda: [0, 0])
+    categories = defaultdict(lambda: [0, 0])
+    selected = Counter()
+    for user_answer_id, question_id, category_id in user_answers:
+        # question was deleted
+        if question_id is None:
+            continue
+        is_correct = sign * int(choices[user_answer_id] == correct[question_id])
+        questions[question_id][0] += sign
+        questions[question_id][1] += is_correct
+        if category_id:
+            categories[category_id][0] += sign
+            categories[category_id][1] += is_correct
+        selected.update({answer_id: sign for answer_id in choices[user_answer_id]})
+
+    _increment(QuestionStatistics, questions, ['attempts', 'correct'])
+    _increment(CategoryStatistics, categories, ['attempts', 'correct'])
+    _increment(AnswerStatistics, {answer_id: [count] for answer_id, count in selected.items()}, ['selected'])
+
+def _increment(model, deltas, fields):
+    """
+    Increases the fields of the rows {pk: [deltas]}, creating missing rows.
+    """
+    existing = model.objects.in_bulk(list(deltas.keys()))
+    created = []
+    for pk, values in deltas.items():
+        row = existing.get(pk)
+        if row is None:
+            row = model(pk=pk)
+            created.append(row)
+        for field, value in zip(fields, values):
+            # the correct answers may have changed since the answer was added
+            setattr(row, field, max(getattr(row, field) + value, 0))
+
+    model.objects.bulk_create(created)
+    model.objects.bulk_update(existing.values(), fields)
@@ -1,4 +1,11 @@
+from io import StringIO
+from django.utils import timezone
+import json
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.test import TestCase
+from wagtail.admin.edit_handlers import ObjectList
 
 from django.contrib.auth.models import AnonymousUser, User
 from wiki.models import Article, ArticleRevision, URLPath
@@ -6,7 +13,11 @@ from wiki.models import Article, ArticleRevision, URLPath
 from pages.models.jurcoach import JurcoachPage
 from wagtailpolls.models import Poll
 
-from .models import Question, QuestionVersion, AnswerVersion, Quiz, UserAnswer
+from .models import Question, QuestionVersion, AnswerVersion, Quiz, UserAnswer, Choice, CategoryQuestions
+from .models import QuestionStatistics, AnswerStatistics, CategoryStatistics
+from .scoring import score_quizzes, summarize_quiz
+from .statistics import update_statistics, SETTLE_TIME
+from .views import get_categories
 
 class QuestionTestCase(TestCase):
     def setUp(self):
@@ -28,6 +39,85 @@ class AnswerVersionTestCase(TestCase):
         answer_version = AnswerVersion.objects.get()
         self.assertEqual(str(answer_version), "Answer 1")
 
+class QuestionVersionTestCase(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create()
+        self.first = QuestionVersion.objects.create(question=self.question, title="Question Version 1")
+        self.first.set_answers([{"text": "Answer 1", "correct": True}, {"text": "Answer 2", "correct": False}])
+        self.first.approve()
+
+    def test_unchanged_answers_are_shared(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 1", "correct": True}, {"text": "Answer 3", "correct": False}])
+        self.assertEqual(AnswerVersion.objects.count(), 3)
+        self.assertEqual(set(self.first.answers.all()) & set(second.answers.all()),
+                         {AnswerVersion.objects.get(text="Answer 1")})
+
+    def test_deleting_old_version_keeps_shared_answers(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 1", "correct": True}, {"text": "Answer 3", "correct": False}])
+        second.approve()
+        self.first.delete()
+        self.assertEqual(sorted(second.answers.values_list('text', flat=True)), ["Answer 1", "Answer 3"])
+        self.assertEqual(AnswerVersion.objects.get(text="Answer 1").question_version, second)
+        self.assertFalse(AnswerVersion.objects.filter(text="Answer 2").exists())
+
+    def test_deleting_question_deletes_all_answers(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 1", "correct": True}])
+        self.question.delete()
+        self.assertFalse(AnswerVersion.objects.exists())
+
+    def test_answers_added_in_admin_belong_to_version(self):
+        answer = AnswerVersion.objects.create(question_version=self.first, text="Answer 4")
+        self.assertIn(answer, self.first.answers.all())
+        self.assertEqual(list(self.first.ordered_answers())[-1], answer)
+
+    def test_answers_keep_their_order(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 3", "correct": False}, {"text": "Answer 1", "correct": True}])
+        self.assertEqual([answer.text for answer in second.ordered_answers()], ["Answer 3", "Answer 1"])
+        self.assertEqual([answer.text for answer in self.first.ordered_answers()], ["Answer 1", "Answer 2"])
+
+    def admin_form(self, version, answer, text):
+        form_class = ObjectList(QuestionVersion.panels).bind_to_model(QuestionVersion).get_form_class()
+        return form_class({
+            "title": version.title,
+            "description": "Description",
+            "own_answers-TOTAL_FORMS": "1",
+            "own_answers-INITIAL_FORMS": "1",
+            "own_answers-MIN_NUM_FORMS": "0",
+            "own_answers-MAX_NUM_FORMS": "1000",
+            "own_answers-0-id": str(answer.id),
+            "own_answers-0-text": text,
+            "own_answers-0-correct": "on",
+        }, instance=version)
+
+    def test_shared_answers_are_read_only_in_admin(self):
+        answer = AnswerVersion.objects.get(text="Answer 1")
+        self.assertTrue(self.admin_form(self.first, answer, "Changed").is_valid())
+
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 1", "correct": True}])
+        self.assertFalse(self.admin_form(self.first, answer, "Changed").is_valid())
+        self.assertTrue(self.admin_form(self.first, answer, "Answer 1").is_valid())
+
+    def test_approve_is_single_update(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second = QuestionVersion.objects.select_related('question').get(pk=second.pk)
+        with CaptureQueriesContext(connection) as queries:
+            second.approve()
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE "quiz_question"')]), 1)
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.current, second)
+
+    def test_with_is_current(self):
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        with self.assertNumQueries(1):
+            versions = {version.id: version.is_current() for version in QuestionVersion.objects.with_is_current()}
+        self.assertEqual(versions, {self.first.id: True, second.id: False})
+        self.assertEqual(list(QuestionVersion.objects.current()), [self.first])
+
 class QuizTestCase(TestCase):
     def setUp(self):
         URLPath.create_root(title="Root")
@@ -41,17 +131,361 @@ class QuizTestCase(TestCase):
                                                           title="Question Version 1")
         answer = AnswerVersion.objects.create(question_version=question_version,
                                               text="Answer 1")
+        question_version.approve()
         UserAnswer.objects.create(quiz=self.quiz,
                                   question=question,
                                   answer=answer)
 
     def test_quiz_has_total_questions(self):
-        self.assertEqual(self.quiz.total_questions(), 1)
+        self.quiz.update_progress()
+        self.assertEqual(self.quiz.total_questions, 1)
 
     def test_quiz_calculates_score(self):
         # FIXME: calculation is broken... ?
         self.assertEqual(self.quiz.calculate_score(), 1)
 
+class ScoringTestCase(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        parent = URLPath.create_urlpath(URLPath.root(), "at",
+                                        title="Title 1",
+                                        content="Content")
+        child = URLPath.create_urlpath(parent, "tb",
+                                       title="Title 2",
+                                       content="Content")
+        self.quiz = Quiz.objects.create(category=parent.article)
+        self.other_quiz = Quiz.objects.create(category=child.article)
+
+        for article in [parent.article, child.article]:
+            question = Question.objects.create(category=article)
+            question_version = QuestionVersion.objects.create(question=question,
+                                                              title="Question")
+            correct = AnswerVersion.objects.create(question_version=question_version,
+                                                   text="Correct", correct=True)
+            wrong = AnswerVersion.objects.create(question_version=question_version,
+                                                 text="Wrong")
+            question_version.approve()
+            # answered correctly in quiz, wrong in other_quiz
+            user_answer = UserAnswer.objects.create(quiz=self.quiz, question=question)
+            Choice.objects.create(user_answer=user_answer, answer=correct)
+            user_answer = UserAnswer.objects.create(quiz=self.other_quiz, question=question)
+            Choice.objects.create(user_answer=user_answer, answer=correct)
+            Choice.objects.create(user_answer=user_answer, answer=wrong)
+
+    def test_score_quizzes(self):
+        self.assertEqual(score_quizzes([self.quiz.id, self.other_quiz.id]), {
+            self.quiz.id: (2, 2),
+            self.other_quiz.id: (0, 1),
+        })
+
+    def test_score_quizzes_uses_fixed_number_of_queries(self):
+        score_quizzes([self.quiz.id, self.other_quiz.id])
+        with self.assertNumQueries(5):
+            score_quizzes([self.quiz.id, self.other_quiz.id])
+
+    def test_score_quizzes_without_quizzes(self):
+        self.assertEqual(score_quizzes([]), {})
+
+    def test_update_quiz_progress_command(self):
+        call_command('update_quiz_progress', stdout=StringIO())
+        self.quiz.refresh_from_db()
+        self.assertEqual((self.quiz.score, self.quiz.answered_count, self.quiz.total_questions), (2, 2, 2))
+
+    def test_summarize_quiz(self):
+        with self.assertNumQueries(6):
+            summary = summarize_quiz(self.other_quiz)
+        self.assertEqual(len(summary), 2)
+        self.assertFalse(summary[0]["correct"])
+        self.assertEqual([(item["answer"].text, item["chosen"]) for item in summary[0]["answers"]],
+                         [("Correct", True), ("Wrong", True)])
+
+class EditedQuestionScoringTestCase(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create()
+        first = QuestionVersion.objects.create(question=self.question, title="Question Version 1")
+        first.set_answers([{"text": "Answer 1", "correct": True}, {"text": "Answer 2", "correct": False}])
+        first.approve()
+        # the correct answer changes in the second version
+        second = QuestionVersion.objects.create(question=self.question, title="Question Version 2")
+        second.set_answers([{"text": "Answer 1", "correct": False}, {"text": "Answer 2", "correct": True}])
+        second.approve()
+        self.correct = second.answers.get(correct=True)
+        self.quiz = Quiz.objects.create()
+
+    def test_scored_against_current_version(self):
+        self.assertEqual(self.quiz.store_answers({self.question.id: [self.correct.id]}), {self.question.id: True})
+        self.assertEqual(self.quiz.calculate_score(), 1)
+        self.assertTrue(summarize_quiz(self.quiz)[0]["correct"])
+
+class CategoryQuestionsTestCase(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        self.parent = URLPath.create_urlpath(URLPath.root(), "at",
+                                             title="Title 1",
+                                             content="Content").article
+        self.child = URLPath.create_urlpath(URLPath.get_by_path("at"), "tb",
+                                            title="Title 2",
+                                            content="Content").article
+        self.questions = []
+        for article in [self.child, self.parent, self.child]:
+            question = Question.objects.create(category=article)
+            QuestionVersion.objects.create(question=question, title="Question").approve()
+            self.questions.append(question.id)
+        # not approved
+        Question.objects.create(category=self.parent)
+
+    def test_contains_descendants_in_order(self):
+        self.assertEqual(CategoryQuestions.for_category(self.parent.id), self.questions)
+        self.assertEqual(CategoryQuestions.for_category(self.child.id), [self.questions[0], self.questions[2]])
+
+    def test_invalidated_on_approve(self):
+        CategoryQuestions.for_category(self.parent.id)
+        question = Question.objects.create(category=self.child)
+        QuestionVersion.objects.create(question=question, title="Question").approve()
+        self.assertEqual(CategoryQuestions.for_category(self.parent.id), self.questions + [question.id])
+
+    def test_invalidated_on_category_change(self):
+        CategoryQuestions.for_category(self.child.id)
+        question = Question.objects.get(pk=self.questions[0])
+        question.category = self.parent
+        question.save()
+        self.assertEqual(CategoryQuestions.for_category(self.child.id), [self.questions[2]])
+
+class QuizNavigationTestCase(TestCase):
+    def setUp(self):
+        self.quiz = Quiz(question_ids=[3, 5, 9])
+
+    def test_navigation(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.quiz.question_position(5), 2)
+            self.assertEqual(self.quiz.next_question_id(5), 9)
+            self.assertEqual(self.quiz.previous_question_id(5), 3)
+            self.assertIsNone(self.quiz.next_question_id(9))
+            self.assertIsNone(self.quiz.previous_question_id(3))
+
+    def test_navigation_for_question_not_in_quiz(self):
+        self.assertIsNone(self.quiz.question_position(4))
+        self.assertEqual(self.quiz.next_question_id(4), 5)
+        self.assertEqual(self.quiz.previous_question_id(4), 3)
+
+class AnswerSubmissionQueriesTestCase(TestCase):
+    """
+    Queries per submitted question: the former path fetched and inserted
+    every chosen answer separately (1 + 2 * answers queries), store_answers
+    needs a fixed number of queries.
+    """
+    def setUp(self):
+        self.question = Question.objects.create()
+        question_version = QuestionVersion.objects.create(question=self.question,
+                                                          title="Question Version 1")
+        self.answer_ids = [
+            AnswerVersion.objects.create(question_version=question_version,
+                                         text="Answer {}".format(i)).id
+            for i in range(6)
+        ]
+        question_version.approve()
+        self.quiz = Quiz.objects.create()
+
+    def submission_queries(self, answer_ids):
+        # a new quiz each time, answering again replaces the earlier answers
+        self.quiz = Quiz.objects.create()
+        with CaptureQueriesContext(connection) as context:
+            self.quiz.store_answers({self.question.id: answer_ids})
+        return len(context)
+
+    def per_answer_submission_queries(self, answer_ids):
+        with CaptureQueriesContext(connection) as context:
+            user_answer = UserAnswer.objects.create(quiz=self.quiz, question=self.question)
+            for answer in answer_ids:
+                Choice.objects.create(user_answer=user_answer, answer=AnswerVersion.objects.get(pk=answer))
+        return len(context)
+
+    def test_queries_do_not_grow_with_answers(self):
+        self.assertEqual(self.submission_queries(self.answer_ids[:1]),
+                         self.submission_queries(self.answer_ids))
+
+    def test_fewer_queries_than_per_answer_path(self):
+        self.assertLess(self.submission_queries(self.answer_ids),
+                        self.per_answer_submission_queries(self.answer_ids))
+
+class StatisticsTestCase(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        url = URLPath.create_urlpath(URLPath.root(), "at",
+                                     title="Title 1",
+                                     content="Content")
+        self.article = url.articles.first().article
+        user = User.objects.create(username='testuser')
+        self.question = Question.objects.create(category=self.article)
+        question_version = QuestionVersion.objects.create(question=self.question,
+                                                          title="Question Version 1")
+        self.correct = AnswerVersion.objects.create(question_version=question_version,
+                                                    text="Answer 1", correct=True)
+        self.wrong = AnswerVersion.objects.create(question_version=question_version,
+                                                  text="Answer 2", correct=False)
+        question_version.approve()
+        self.quiz = Quiz.objects.create(category=self.article, user=user)
+
+    def answer(self, answer_ids, quiz=None):
+        (quiz or Quiz.objects.create(category=self.article)).store_answers({self.question.id: answer_ids})
+        UserAnswer.objects.update(created=timezone.now() - SETTLE_TIME)
+
+    def test_update_statistics(self):
+        self.answer([self.correct.id])
+        self.answer([self.correct.id, self.wrong.id])
+        self.assertEqual(update_statistics(), 2)
+
+        statistics = QuestionStatistics.objects.get(question=self.question)
+        self.assertEqual((statistics.attempts, statistics.correct, statistics.correct_rate()), (2, 1, 50))
+        category = CategoryStatistics.objects.get(category=self.article)
+        self.assertEqual((category.attempts, category.correct), (2, 1))
+        self.assertEqual(AnswerStatistics.objects.get(answer=self.correct).selected, 2)
+        self.assertEqual(AnswerStatistics.objects.get(answer=self.wrong).selected, 1)
+
+    def test_update_statistics_is_incremental(self):
+        self.answer([self.correct.id])
+        update_statistics()
+        self.answer([self.wrong.id])
+        self.assertEqual(update_statistics(batch_size=1), 1)
+        self.assertEqual(update_statistics(), 0)
+
+        statistics = QuestionStatistics.objects.get(question=self.question)
+        self.assertEqual((statistics.attempts, statistics.correct), (2, 1))
+
+    def test_replaced_answers_are_subtracted(self):
+        self.answer([self.correct.id], quiz=self.quiz)
+        update_statistics()
+        self.answer([self.wrong.id], quiz=self.quiz)
+        update_statistics()
+
+        statistics = QuestionStatistics.objects.get(question=self.question)
+        self.assertEqual((statistics.attempts, statistics.correct), (1, 0))
+        category = CategoryStatistics.objects.get(category=self.article)
+        self.assertEqual((category.attempts, category.correct), (1, 0))
+        self.assertEqual(AnswerStatistics.objects.get(answer=self.correct).selected, 0)
+        self.assertEqual(AnswerStatistics.objects.get(answer=self.wrong).selected, 1)
+
+    def test_skips_unsettled_answers(self):
+        self.quiz.store_answers({self.question.id: [self.correct.id]})
+        self.assertEqual(update_statistics(), 0)
+
+class RepeatedAnswerTestCase(TestCase):
+    def setUp(self):
+        self.question = Question.objects.create()
+        question_version = QuestionVersion.objects.create(question=self.question, title="Question Version 1")
+        self.correct = AnswerVersion.objects.create(question_version=question_version, text="Answer 1", correct=True)
+        self.wrong = AnswerVersion.objects.create(question_version=question_version, text="Answer 2")
+        question_version.approve()
+        self.quiz = Quiz.objects.create(total_questions=1)
+
+    def test_answering_again_replaces_the_answer(self):
+        self.quiz.store_answers({self.question.id: [self.correct.id]})
+        self.quiz.store_answers({self.question.id: [self.wrong.id]})
+        self.assertEqual(UserAnswer.objects.filter(quiz=self.quiz).count(), 1)
+        self.assertEqual(Choice.objects.count(), 1)
+        self.assertEqual(list(Choice.objects.values_list('answer_id', flat=True)), [self.wrong.id])
+        self.assertEqual(self.quiz.calculate_score(), 0)
+
+    def test_counters_count_each_question_once(self):
+        for answer in [self.correct, self.correct, self.wrong, self.correct]:
+            self.quiz.store_answers({self.question.id: [answer.id]})
+            self.quiz.refresh_from_db()
+            self.assertEqual((self.quiz.score, self.quiz.answered_count), (int(answer.correct), 1))
+
+class QuizViewTestCase(TestCase):
+    def setUp(self):
+        URLPath.create_root(title="Root")
+        url = URLPath.create_urlpath(URLPath.root(), "at",
+                                     title="Title 1",
+                                     content="Content")
+        URLPath.create_urlpath(URLPath.root(), "bt",
+                               title="Title 2",
+                               content="Content")
+        self.article = url.articles.first().article
+        self.user = User.objects.create(username='testuser')
+        self.question = Question.objects.create(category=self.article)
+        question_version = QuestionVersion.objects.create(question=self.question,
+                                                          title="Question Version 1")
+        self.correct = AnswerVersion.objects.create(question_version=question_version,
+                                                    text="Answer 1", correct=True)
+        question_version.approve()
+        self.quiz = Quiz.objects.create(category=self.article, user=self.user, total_questions=1)
+
+    def test_answer_updates_progress(self):
+        self.client.force_login(self.user)
+        response = self.client.post("/quiz/category/{}/question/{}/".format(self.article.id, self.question.id),
+                                    {"answer": [self.correct.id], "state": "finished"})
+        self.assertRedirects(response, "/profile/quizzes", fetch_redirect_response=False)
+        self.quiz.refresh_from_db()
+        self.assertTrue(self.quiz.completed)
+        self.assertEqual((self.quiz.score, self.quiz.answered_count), (1, 1))
+
+    def test_start_snapshots_questions(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/quiz/category/{}/question/{}/?state=start".format(self.article.id, self.question.id))
+        self.assertContains(response, "Frage 1 von 1", status_code=200)
+        self.assertContains(response, "MCT beenden")
+        quiz = Quiz.objects.filter(user=self.user).last()
+        self.assertEqual(quiz.question_ids, [self.question.id])
+        self.assertNotContains(response, "Vorherige Frage")
+
+    def test_previous_question_link(self):
+        second = Question.objects.create(category=self.article)
+        QuestionVersion.objects.create(question=second, title="Question Version 2").approve()
+        self.client.force_login(self.user)
+        self.client.get("/quiz/category/{}/question/{}/?state=start".format(self.article.id, self.question.id))
+        response = self.client.get("/quiz/category/{}/question/{}/".format(self.article.id, second.id))
+        self.assertContains(response, "Frage 2 von 2")
+        self.assertContains(response, 'href="/quiz/category/{}/question/{}/">Vorherige Frage'.format(self.article.id, self.question.id))
+
+    def test_api_quiz_withholds_correctness(self):
+        response = self.client.get("/quiz/api/category/{}/".format(self.article.id))
+        self.assertEqual(response.status_code, 200)
+        questions = response.json()["questions"]
+        self.assertEqual([question["id"] for question in questions], [self.question.id])
+        self.assertEqual(questions[0]["answers"], [{"id": self.correct.id, "text": "Answer 1"}])
+
+    def test_api_submit_quiz(self):
+        self.client.force_login(self.user)
+        response = self.client.post("/quiz/api/category/{}/submit/".format(self.article.id),
+                                    json.dumps({"answers": {str(self.question.id): [self.correct.id]}}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["score"], response.json()["total"]), (1, 1))
+        quiz = Quiz.objects.get(pk=response.json()["quiz"])
+        self.assertTrue(quiz.completed)
+        self.assertEqual((quiz.score, quiz.answered_count), (1, 1))
+        self.assertEqual(Choice.objects.filter(user_answer__quiz=quiz).count(), 1)
+
+    def test_anonymous_quiz_is_kept_in_session(self):
+        self.client.get("/quiz/category/{}/question/{}/?state=start".format(self.article.id, self.question.id))
+        response = self.client.post("/quiz/category/{}/question/{}/".format(self.article.id, self.question.id),
+                                    {"answer": [self.correct.id]})
+        self.assertRedirects(response, "/quiz", fetch_redirect_response=False)
+        self.assertEqual(Quiz.objects.count(), 1)
+        self.assertEqual(UserAnswer.objects.count(), 0)
+        data = self.client.session["quizzes"][str(self.article.id)]
+        self.assertEqual((data["score"], data["completed"]), (1, True))
+
+    def test_anonymous_quiz_is_adopted_on_login(self):
+        self.client.get("/quiz/category/{}/question/{}/?state=start".format(self.article.id, self.question.id))
+        self.client.post("/quiz/category/{}/question/{}/".format(self.article.id, self.question.id),
+                         {"answer": [self.correct.id]})
+        self.client.force_login(self.user)
+        quiz = Quiz.objects.filter(user=self.user).last()
+        self.assertNotEqual(quiz, self.quiz)
+        self.assertTrue(quiz.completed)
+        self.assertEqual((quiz.score, quiz.answered_count, quiz.total_questions), (1, 1, 1))
+        self.assertNotIn("quizzes", self.client.session)
+
+    def test_anonymous_api_submit_quiz_writes_nothing(self):
+        response = self.client.post("/quiz/api/category/{}/submit/".format(self.article.id),
+                                    json.dumps({"answers": {str(self.question.id): [self.correct.id]}}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()["quiz"], response.json()["score"]), (None, 1))
+        self.assertEqual(Quiz.objects.count(), 1)
+
 class IndexViewTests(TestCase):
 
     def setUp(self):
@@ -74,3 +508,20 @@ class IndexViewTests(TestCase):
     def test_index_response(self):
         response = self.client.get("/quiz/")
         self.assertContains(response, "jurcoach-page", status_code=200)
+
+    def test_categories_are_plain_data(self):
+        article = URLPath.create_urlpath(URLPath.get_by_path("at"), "tb",
+                                         title="Tatbestand",
+                                         content="Content").article
+        self.assertEqual(get_categories("at")[0]["question_count"], 0)
+
+        question = Question.objects.create(category=article)
+        QuestionVersion.objects.create(question=question, title="Question").approve()
+        self.assertEqual(get_categories("at"), [{
+            "id": article.id,
+            "title": "Tatbestand",
+            "path": "at/tb/",
+            "other_read": article.other_read,
+            "question_count": 1,
+            "first_question_id": question.id,
+        }])
@@ -32,5 +32,9 @@ urlpatterns = [
     path('question/<int:question_id>/', views.detail, name='detail'),
     # Get tree for dropdown in add_question
     path('api/category_tree/', views.get_category_tree, name='get_category_tree'),
+    # whole quiz of a category in one request
+    path('api/category/<int:category_id>/', views.api_quiz, name='api_quiz'),
+    # submit all answers of a quiz at once
+    path('api/category/<int:category_id>/submit/', views.api_submit_quiz, name='api_submit_quiz'),
     path('api/json/', include(router.urls)),
 ]
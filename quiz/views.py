@@ -3,16 +3,20 @@ from rest_framework.permissions import AllowAny
 from rest_framework import generics, mixins, viewsets
 
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponseRedirect, JsonResponse
-from django.contrib.auth.models import User
-from django.core.cache import cache
-import hashlib
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.db import transaction
+from django.db.models import Prefetch
+from django.views.decorators.http import require_POST
+import json
 from datetime import datetime
 
-from wiki.models import Article, URLPath
+from wiki.models import Article
 
+from core.wiki_tree import children
 from pages.models.jurcoach import JurcoachPage
-from .models import Question, QuestionVersion, AnswerVersion, Quiz, UserAnswer, Choice
+from .models import Question, QuestionVersion, AnswerVersion, Quiz, UserAnswer, Choice, CategoryQuestions, ANSWER_ORDER
+from .scoring import correct_answers, check_answers
+from .sessions import SessionQuiz
 from .serializers import *
 
 
@@ -48,17 +52,20 @@ def edit_question(request, question_id):
 
 def quiz_finish(request, category_id):
     category = get_object_or_404(Article, id=category_id)
-    quiz = Quiz.objects.filter(category__id=category.id).filter(user__id=request.user.id).filter(completed=False).first()
-    quiz.completed = True
-    quiz.save()
+    quiz = get_running_quiz(request, category)
+    if quiz:
+        quiz.completed = True
+        quiz.save(update_fields=['completed', 'updated'])
 
     return render(request, 'quiz/finished.html', {'category': category})
 
 # retake quizz redirect (called from profile/quizzes)
 def quiz_for_category(request, category_id):
     category = get_object_or_404(Article, id=category_id)
-    question = get_questions(URLPath.objects.get(article=category.id)).first()
-    return HttpResponseRedirect('/quiz/category/{}/question/{}/?state=start'.format(category.id, question.id))
+    question_ids = CategoryQuestions.for_category(category.id)
+    if not question_ids:
+        raise Http404("No questions for category")
+    return HttpResponseRedirect('/quiz/category/{}/question/{}/?state=start'.format(category.id, question_ids[0]))
 
 # FIXME: what is the emeaning of this?
 def detail(request, question_id):
@@ -67,65 +74,153 @@ def detail(request, question_id):
 
 def quiz(request, category_id, question_id):
     category = get_object_or_404(Article, id=category_id)
-    question = get_object_or_404(Question, id=question_id)
-    questions = get_questions(URLPath.objects.get(article=category.id))
-
-    if request.user.id:
-        user = request.user
-    else:
-        user = User.objects.get(username="anonym")
+    question = get_object_or_404(Question.objects.select_related('current'), id=question_id)
 
     if request.method == 'POST':
-        # FIXME: anonymous users overwrite their quizes (was hat sich hier jemand gedacht?)
-        quiz = Quiz.objects.filter(category__id=category.id).filter(user__id=user.id).filter(completed=False).last()
-        user_answer = UserAnswer(
-            question=question,
-            quiz=quiz,
-        )
-        user_answer.save()
+        quiz = get_running_quiz(request, category)
+        if not quiz:
+            return HttpResponseRedirect('/quiz/category/{}/question/{}/?state=start'.format(category.id, question.id))
+        quiz.store_answers({question.id: request.POST.getlist('answer')})
+        next_question_id = quiz.next_question_id(question.id)
 
-        for answer in request.POST.getlist('answer'):
-            choice = Choice(
-                user_answer=user_answer,
-                answer=AnswerVersion.objects.get(pk=answer)
-            )
-            choice.save()
-
-        if request.POST.get('state') == 'finished':
+        if request.POST.get('state') == 'finished' or not next_question_id:
             quiz.completed = True
-            quiz.save()
+            quiz.save(update_fields=['completed', 'updated'])
 
             if request.user.is_anonymous:
                 return HttpResponseRedirect('/quiz')
             else:
                 return HttpResponseRedirect('/profile/quizzes')
         else:
-            next_question = questions.filter(id__gt=question_id).first()
-            return HttpResponseRedirect('/quiz/category/{}/question/{}/'.format(category.id, next_question.id))
+            return HttpResponseRedirect('/quiz/category/{}/question/{}/'.format(category.id, next_question_id))
         #else:
         #    request.session['category'][category_id]['question'][question_id]['answer'][answer_id]
     else:
-        # If user starts a new quiz, create quiz object
+        # If user starts a new quiz, create quiz object with a snapshot of the questions
         if request.GET.get('state') == 'start':
-            quiz = Quiz(
-                completed=False,
-                category=category,
-                user=user,
-            )
-            quiz.save()
-            question = questions[0]
+            question_ids = CategoryQuestions.for_category(category.id)
+            if not question_ids:
+                raise Http404("No questions for category")
+            if request.user.is_anonymous:
+                quiz = SessionQuiz.start(request.session, category.id, question_ids)
+            else:
+                quiz = Quiz(
+                    completed=False,
+                    category=category,
+                    user=request.user,
+                    question_ids=question_ids,
+                    total_questions=len(question_ids),
+                )
+                quiz.save()
+            if question.id != question_ids[0]:
+                question = get_object_or_404(Question.objects.select_related('current'), id=question_ids[0])
+        else:
+            quiz = get_running_quiz(request, category)
+            # not started, navigate through the current questions of the category
+            if not quiz:
+                quiz = Quiz(category=category)
 
         question_version = question.current
         return render(request, 'quiz/show.html', {
             'banner': '/media/original_images/ohnediefrau.png',
             'category': category,
+            'question': question,
             'question_version': question_version,
-            'questions': questions,
+            'position': quiz.question_position(question.id),
+            'total': len(quiz.get_question_ids()),
+            'is_last': not quiz.next_question_id(question.id),
+            'previous_question_id': quiz.previous_question_id(question.id),
             'categories_at': get_categories("at"),
             'categories_bt': get_categories("bt"),
         })
 
 
+def get_running_quiz(request, category):
+    """
+    The running quiz of the visitor for the category: a Quiz for users, a
+    SessionQuiz for anonymous visitors.
+    """
+    if request.user.is_anonymous:
+        return SessionQuiz.load(request.session, category.id)
+    return Quiz.objects.filter(category__id=category.id).filter(user__id=request.user.id).filter(completed=False).last()
+
+def api_quiz(request, category_id):
+    """
+    Whole quiz of a category in one response. Correctness and descriptions
+    of the answers are withheld until the quiz is submitted.
+    """
+    category = get_object_or_404(Article.objects.select_related('current_revision'), id=category_id)
+    question_ids = CategoryQuestions.for_category(category.id)
+    questions = (Question.objects
+                 .filter(id__in=question_ids)
+                 .select_related('current')
+                 .prefetch_related(Prefetch('current__answers', queryset=AnswerVersion.objects.order_by(*ANSWER_ORDER)))
+                 .order_by('id'))
+
+    return JsonResponse({
+        "category": {
+            "id": category.id,
+            "title": category.current_revision.title,
+        },
+        "questions": [{
+            "id": question.id,
+            "version": question.current.id,
+            "title": question.current.title,
+            "answers": [{
+                "id": answer.id,
+                "text": answer.text,
+            } for answer in question.current.answers.all()],
+        } for question in questions],
+    })
+
+@require_POST
+def api_submit_quiz(request, category_id):
+    """
+    Stores all answers of a quiz at once: {"answers": {question_id: [answer ids]}}
+    """
+    category = get_object_or_404(Article, id=category_id)
+    try:
+        answers = json.loads(request.body).get("answers", {})
+        answers = {int(question_id): [int(id) for id in answer_ids] for question_id, answer_ids in answers.items()}
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({"error": "invalid answers"}, status=400)
+
+    question_ids = CategoryQuestions.for_category(category.id)
+    answers = {question_id: answers[question_id] for question_id in question_ids if question_id in answers}
+
+    if request.user.is_anonymous:
+        # answers of anonymous visitors are only checked, not stored
+        quiz = None
+        results = {question_id: correct for question_id, (_, correct) in check_answers(answers).items()}
+    else:
+        with transaction.atomic():
+            quiz = Quiz.objects.create(
+                completed=True,
+                category=category,
+                user=request.user,
+                question_ids=question_ids,
+                total_questions=len(question_ids),
+            )
+            results = quiz.store_answers(answers)
+
+    correct = correct_answers(results.keys())
+    descriptions = dict(QuestionVersion.objects
+                        .filter(current_version__in=results.keys())
+                        .values_list('current_version', 'description'))
+
+    return JsonResponse({
+        "quiz": quiz.id if quiz else None,
+        "score": sum(results.values()),
+        "total": len(question_ids),
+        "results": [{
+            "question": question_id,
+            "correct": results[question_id],
+            "correct_answers": sorted(correct[question_id]),
+            "description": descriptions.get(question_id, ""),
+        } for question_id in results],
+    })
+
+
 class QuestionCreateOrUpdateSet(mixins.CreateModelMixin, generics.GenericAPIView):
     serializer_class = QuestionSerializer
 
@@ -159,13 +254,7 @@ class QuestionCreateOrUpdateSet(mixins.CreateModelMixin, generics.GenericAPIView
             user=user,
         )
 
-        for answer in data.get("answers"):
-            question_version.answers.create(
-                text=answer.get("text"),
-                correct=answer.get("correct")
-            )
-
-        question_version.save()
+        question_version.set_answers(data.get("answers"))
         url = "/cms/quiz/questionversion/?q=%s" % str(question_version.id)
 
         if request.user.is_superuser:
@@ -215,8 +304,8 @@ class ChoiceViewSet(viewsets.ModelViewSet):
     permission_classes = [AllowAny]
 
 def get_category_tree(request):
-    at = filter(lambda x: x["category"].article.other_read, get_categories("at"))
-    bt = filter(lambda x: x["category"].article.other_read, get_categories("bt"))
+    at = filter(lambda x: x["other_read"], get_categories("at"))
+    bt = filter(lambda x: x["other_read"], get_categories("bt"))
     tree = {
             "id": "cat",
             "label": "Problemfeldwiki",
@@ -238,37 +327,22 @@ def get_category_tree(request):
 
 def _tree_entry(category):
     return {
-        "id": category["category"].article.id,
-        "label": category["category"].article.current_revision.title,
+        "id": category["id"],
+        "label": category["title"],
     }
 
-def get_questions(cat):
-    questions_set = [cat.article.questions.all()] + [sub.article.questions.all() for sub in cat.get_children()]
-    ids = []
-    for questions in questions_set:
-        for question in questions:
-            if question.approved and question.current:
-                ids.append(question.id)
-    return Question.objects.filter(id__in=ids).order_by('id')
-
 def get_categories(slug):
-    modified = Article.objects.order_by('-modified').first().modified
-    hash = hashlib.md5((str(modified) + slug).encode('utf-8')).hexdigest()
-    result = cache.get_or_set("quiz_categories_" + slug, lambda: _get_categories(slug), timeout=(60 * 60), version=hash)
-    return result
-
-def _get_categories(slug):
-    cat = URLPath.get_by_path(slug)
-    categories = []
-
-    for child in cat.get_children():
-        questions = get_questions(child)
-
-        category = {
-            "category": child,
-            "questions": questions,
-        }
-        categories.append(category)
-
-    categories.sort(key=lambda c: c["category"].path)
+    """
+    Plain menu entries for the children of the wiki article at slug, from
+    the wiki tree snapshot.
+    """
+    categories = [{
+        "id": child["id"],
+        "title": child["title"],
+        "path": child["path"],
+        "other_read": child["other_read"],
+        "question_count": child["question_count"],
+        "first_question_id": child["first_question_id"],
+    } for child in children(slug + "/")]
+    categories.sort(key=lambda c: c["path"])
     return categories
@@ -1,10 +1,13 @@
 from django.conf.urls import url
-from wagtail.contrib.modeladmin.helpers import AdminURLHelper, ButtonHelper
-from wagtail.contrib.modeladmin.options import ModelAdminGroup, modeladmin_register
+from django.db.models import Prefetch
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from wagtail.contrib.modeladmin.helpers import AdminURLHelper, ButtonHelper, PermissionHelper
+from wagtail.contrib.modeladmin.options import ModelAdmin, ModelAdminGroup, modeladmin_register
 from treemodeladmin.options import TreeModelAdmin
 from django.shortcuts import redirect
 
-from .models import Question, QuestionVersion
+from .models import Question, QuestionVersion, AnswerVersion, QuestionStatistics, AnswerStatistics, CategoryStatistics, ANSWER_ORDER
 
 class QuestionVersionButtonHelper(ButtonHelper):
     def get_buttons_for_obj(self, question_version, **kwargs):
@@ -39,6 +42,9 @@ class QuestionVersionAdmin(TreeModelAdmin):
     ordering = ['-id']
     button_helper_class = QuestionVersionButtonHelper
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_is_current().select_related('question', 'user')
+
     def get_admin_urls_for_registration(self):
         urls = super().get_admin_urls_for_registration()
 
@@ -73,8 +79,65 @@ class QuestionAdmin(TreeModelAdmin):
     list_filter = ('category',)
     ordering = ['category', 'id']
 
+class StatisticsPermissionHelper(PermissionHelper):
+    """
+    Statistics are maintained by the update_quiz_statistics command only.
+    """
+    def user_can_create(self, user):
+        return False
+
+    def user_can_edit_obj(self, user, obj):
+        return False
+
+    def user_can_delete_obj(self, user, obj):
+        return False
+
+class QuestionStatisticsAdmin(ModelAdmin):
+    model = QuestionStatistics
+    menu_label = 'Statistik'
+    menu_icon = 'table'
+    permission_helper_class = StatisticsPermissionHelper
+    list_display = ('question', 'title', 'attempts', 'correct', 'correct_rate', 'answers')
+    list_filter = ('question__category',)
+    search_fields = ('question__id',)
+    ordering = ['correct', '-attempts']
+
+    def get_queryset(self, request):
+        return (super().get_queryset(request)
+                .select_related('question__current')
+                .prefetch_related(Prefetch('question__current__answers', queryset=AnswerVersion.objects.order_by(*ANSWER_ORDER)),
+                                  'question__current__answers__statistics'))
+
+    def title(self, obj):
+        return obj.question.current.title if obj.question.current else ""
+
+    def answers(self, obj):
+        if not obj.question.current:
+            return ""
+        return format_html_join(mark_safe('<br>'), '{} {}: {}', (
+            ('✓' if answer.correct else '✗', answer.text, _selected(answer))
+            for answer in obj.question.current.answers.all()
+        ))
+
+def _selected(answer):
+    try:
+        return answer.statistics.selected
+    except AnswerStatistics.DoesNotExist:
+        return 0
+
+class CategoryStatisticsAdmin(ModelAdmin):
+    model = CategoryStatistics
+    menu_label = 'Kategorie Statistik'
+    menu_icon = 'table'
+    permission_helper_class = StatisticsPermissionHelper
+    list_display = ('category', 'attempts', 'correct', 'correct_rate')
+    ordering = ['correct', '-attempts']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('category__current_revision')
+
 @modeladmin_register
 class QuestionMenuAdmin(ModelAdminGroup):
     menu_label = 'MCT'
     menu_icon = 'folder'
-    items = (QuestionAdmin, QuestionVersionAdmin)
+    items = (QuestionAdmin, QuestionVersionAdmin, QuestionStatisticsAdmin, CategoryStatisticsAdmin)